@@ -1,4 +1,5 @@
 import os
+import json
 from datetime import datetime
 import duckdb
 import boto3
@@ -57,6 +58,42 @@ def setup_duckdb_connection():
     )
 
 
+def reassemble_parts(df: pd.DataFrame, event: str = "scraping") -> list[dict]:
+    """
+    Reassembles the events that were too large to be sent and were split into part events.
+
+    Args:
+      df (pd.DataFrame): The raw events.
+      event (str): The type of the split events.
+
+    Returns:
+      list[dict]: The payloads of the reassembled events.
+    """
+    parts = df[df["event"] == f"{event}_part"]
+    grouped_parts: dict[str, list] = {}
+
+    for part, data in zip(parts["part"], parts["data"]):
+        grouped_parts.setdefault(part["id"], []).append(
+            (part["index"], part["count"], data)
+        )
+
+    payloads = []
+
+    for part_id, items in grouped_parts.items():
+        # the same part may be sent more than once
+        items = sorted(set(items))
+
+        if [index for index, _, _ in items] != list(range(items[0][1])):
+            print(
+                f"Skipping incomplete event {part_id}: {len(items)}/{items[0][1]} parts"
+            )
+            continue
+
+        payloads.append(json.loads("".join(data for _, _, data in items))["payload"])
+
+    return payloads
+
+
 def main():
     args = argparse.ArgumentParser(description="Archive R2 data to Parquet")
     args.add_argument(
@@ -79,7 +116,9 @@ def main():
 
     print(f"Archiving data for date: {date_string}")
 
-    query = f"SELECT * FROM read_json('r2://{bucket_name}/event_date={date_string}/**/*.json.gz')"
+    # the payload is kept as raw JSON, so the fields of the other events (e.g. run_stats)
+    # are not merged into the schema of the articles
+    query = f"SELECT event, payload, part, data FROM read_json('r2://{bucket_name}/event_date={date_string}/**/*.json.gz', columns={{event: 'VARCHAR', payload: 'JSON', part: 'STRUCT(id VARCHAR, index INTEGER, count INTEGER)', data: 'VARCHAR'}})"
 
     try:
         df = conn.execute(query).df()
@@ -88,8 +127,12 @@ def main():
             print(f"No data found for date: {date_string}")
             return
 
-        df = df[df["event"] == "scraping"]  # filter for scraping events
-        df = pd.DataFrame(df["payload"].tolist())  # extract payload column
+        # filter for scraping events and extract payload column
+        payloads = [
+            json.loads(payload) for payload in df[df["event"] == "scraping"]["payload"]
+        ]
+        payloads += reassemble_parts(df)  # add the articles sent in parts
+        df = pd.DataFrame(payloads)
         df = df.drop_duplicates(
             subset=["url"]
         )  # remove duplicates based on title and date
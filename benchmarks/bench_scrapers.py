@@ -0,0 +1,357 @@
+"""
+Offline benchmark of the scrapers against recorded responses.
+
+The index and article responses of each scraper are recorded once from the live sites,
+in the cassette format of scraper.cassette, then served by a local aiohttp server which every request of the scrapers is routed to.
+Each scraper is run in its own process through scrape.run_scrapers, with the batches of
+events discarded instead of sent, so its CPU time and peak memory are measured separately.
+
+Usage:
+  python -m benchmarks.bench_scrapers --record        # record the fixtures from the live sites
+  python -m benchmarks.bench_scrapers                 # benchmark all scrapers with fixtures
+  python -m benchmarks.bench_scrapers --scraper HK01 --scraper On.cc
+"""
+
+import argparse
+import asyncio
+import gzip
+import json
+import multiprocessing
+import os
+import re
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date as Date, datetime as DateTime, timezone
+from typing import Dict, List, Optional
+from urllib.parse import quote
+import aiohttp
+from aiohttp import web
+from scraper.cassette import (
+    RecordedResponse,
+    from_record,
+    load_records,
+    request_key,
+    save_records,
+    to_record,
+)
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+# the headers which are not forwarded to the live sites when recording
+HOP_BY_HOP_HEADERS = {"host", "content-length", "connection", "accept-encoding"}
+
+
+def fixture_path(fixtures_dir: str, scraper_key: str) -> str:
+    return os.path.join(
+        fixtures_dir, re.sub(r"[^\w.-]", "_", scraper_key) + ".ndjson.gz"
+    )
+
+
+class FixtureServer:
+    """
+    A local stand-in for the scraped sites, serving the recorded responses of one scraper at a time.
+
+    The original URL is passed in the `url` query parameter. In record mode the
+    responses which are not recorded yet are fetched from the live site and stored.
+    """
+
+    def __init__(self, fixtures_dir: str = FIXTURES_DIR, record: bool = False):
+        self.fixtures_dir = fixtures_dir
+        self.record = record
+        self.fixtures: Dict[str, dict] = {}
+        self.scraper_key: Optional[str] = None
+        self.recorded_at: Optional[DateTime] = None
+        self.served = 0
+        self.missing = 0
+        self.port: Optional[int] = None
+        self._runner: Optional[web.AppRunner] = None
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def load(self, scraper_key: str):
+        path = fixture_path(self.fixtures_dir, scraper_key)
+        self.scraper_key = scraper_key
+        self.fixtures = load_records(path)
+        self.recorded_at = fixture_recorded_at(path)
+        self.served = 0
+        self.missing = 0
+
+    def save(self):
+        if self.record and self.fixtures:
+            recorded_at = self.recorded_at or DateTime.now(timezone.utc)
+            save_records(
+                fixture_path(self.fixtures_dir, self.scraper_key),
+                self.fixtures,
+                metadata={"recorded_at": recorded_at.isoformat()},
+            )
+
+    async def start(self):
+        app = web.Application(client_max_size=64 * 1024**2)
+        app.router.add_route("*", "/", self.handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+        if self.record:
+            self._session = aiohttp.ClientSession()
+
+    async def stop(self):
+        if self._session is not None:
+            await self._session.close()
+
+        await self._runner.cleanup()
+
+    async def handle(self, request: web.Request) -> web.Response:
+        url = request.query["url"]
+        body = await request.text() or None
+        key = request_key(request.method, url, body)
+        record = self.fixtures.get(key)
+
+        if record is None and self.record:
+            try:
+                record = await self._fetch(request, url, body)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                return web.Response(status=502, text=f"Error recording {key}: {e}")
+
+            self.fixtures[key] = record
+
+        if record is None:
+            self.missing += 1
+            return web.Response(status=404, text=f"No fixture for {key}")
+
+        self.served += 1
+        response = from_record(record)
+
+        return web.Response(
+            status=response.status,
+            body=response.content,
+            headers={"Content-Type": response.content_type or "text/html"},
+        )
+
+    async def _fetch(self, request: web.Request, url: str, body: Optional[str]) -> dict:
+        headers = {
+            name: value
+            for name, value in request.headers.items()
+            if name.lower() not in HOP_BY_HOP_HEADERS
+        }
+
+        async with self._session.request(
+            request.method, url, headers=headers, data=body, timeout=30
+        ) as response:
+            recorded_response = RecordedResponse(
+                str(response.url),
+                response.status,
+                response.headers.get("Content-Type"),
+                await response.read(),
+            )
+
+            return to_record(request.method, url, body, recorded_response)
+
+
+def fixture_recorded_at(path: str) -> Optional[DateTime]:
+    """
+    Returns when the fixtures were recorded, from the metadata line of the file if any.
+    """
+    if not os.path.exists(path):
+        return None
+
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        metadata = json.loads(f.readline() or "{}")
+
+    return (
+        DateTime.fromisoformat(metadata["recorded_at"])
+        if "recorded_at" in metadata
+        else None
+    )
+
+
+async def _run_pipeline(scraper_key: str, scraper, today: Date) -> dict:
+    from scrape import EventBatcher, _fetch_context, run_scrapers
+    from scraper.rate_limit import RateLimiter
+    from scraper.stats import RunStats
+
+    sent = {"batches": 0, "bytes": 0}
+
+    def discard_batch(body: bytes):
+        sent["batches"] += 1
+        sent["bytes"] += len(body)
+
+    run_stats = RunStats()
+    batcher = EventBatcher(sink=discard_batch)
+    # the extraction pool of scrape.run_pipeline
+    executor = ProcessPoolExecutor(
+        max_workers=os.cpu_count(), mp_context=multiprocessing.get_context("spawn")
+    )
+
+    try:
+        async with _fetch_context(
+            None, RateLimiter(initial_concurrency=scraper.num_proc), None, None, None
+        ):
+            await run_scrapers(
+                {scraper_key: scraper},
+                batcher=batcher,
+                today=today,
+                timestamp=DateTime.combine(today, DateTime.min.time()).isoformat(),
+                executor=executor,
+                run_stats=run_stats,
+            )
+
+        batcher.flush()
+    finally:
+        executor.shutdown()
+
+    return {**run_stats.sources[scraper_key].to_dict(), **sent}
+
+
+def run_scraper(scraper_key: str, port: int, today: Date) -> dict:
+    """
+    Runs a scraper through the pipeline of scrape.py against the fixture server.
+
+    The articles are fetched, filtered, extracted in the process pool and batched like in
+    a run of the pipeline, the batches are discarded instead of being sent.
+
+    Returns:
+      dict: The measurements of the run.
+    """
+    from scrape import get_scrapers
+    from scraper.utils import set_url_rewriter
+
+    set_url_rewriter(
+        lambda url: f"http://127.0.0.1:{port}/?url={quote(str(url), safe='')}"
+    )
+    scraper = get_scrapers(num_proc=3)[scraper_key]
+
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    stats = asyncio.run(_run_pipeline(scraper_key, scraper, today))
+    wall_time = time.perf_counter() - start
+    # the extraction runs in the pool processes, which are waited for once it shuts down
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu_time = time.process_time() - cpu_start + children.ru_utime + children.ru_stime
+
+    return {
+        "scraper": scraper_key,
+        "articles": stats["events"],
+        "wall_time": wall_time,
+        "extract_time": stats["page_parse_time"] + stats["extract_time"],
+        "articles_per_sec": stats["events"] / wall_time if wall_time else None,
+        "cpu_time": cpu_time,
+        # in kilobytes on Linux
+        "peak_rss_mb": max(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, children.ru_maxrss
+        )
+        / 1024,
+        "batches": stats["batches"],
+        "batch_bytes": stats["bytes"],
+    }
+
+
+async def benchmark(
+    scraper_keys: List[str], fixtures_dir: str, record: bool
+) -> List[dict]:
+    server = FixtureServer(fixtures_dir, record=record)
+    await server.start()
+    results = []
+
+    try:
+        for scraper_key in scraper_keys:
+            server.load(scraper_key)
+
+            if not server.fixtures and not record:
+                print(f"No fixtures for {scraper_key}, skipping...", file=sys.stderr)
+                continue
+
+            # the articles published on the day the fixtures were recorded are kept
+            today = (server.recorded_at or DateTime.now(timezone.utc)).date()
+
+            process = await asyncio.create_subprocess_exec(
+                sys.executable,
+                "-m",
+                "benchmarks.bench_scrapers",
+                "--child",
+                scraper_key,
+                "--port",
+                str(server.port),
+                "--today",
+                today.isoformat(),
+                stdout=asyncio.subprocess.PIPE,
+            )
+            stdout, _ = await process.communicate()
+            server.save()
+
+            if process.returncode != 0:
+                print(f"Error benchmarking {scraper_key}", file=sys.stderr)
+                continue
+
+            result = json.loads(stdout.decode("utf-8").strip().splitlines()[-1])
+            result["served"] = server.served
+            result["missing"] = server.missing
+            results.append(result)
+    finally:
+        await server.stop()
+
+    return results
+
+
+def print_results(results: List[dict]):
+    columns = [
+        ("scraper", "{}"),
+        ("articles", "{}"),
+        ("articles_per_sec", "{:.1f}"),
+        ("wall_time", "{:.2f}"),
+        ("extract_time", "{:.2f}"),
+        ("cpu_time", "{:.2f}"),
+        ("peak_rss_mb", "{:.1f}"),
+        ("missing", "{}"),
+    ]
+    rows = [[name for name, _ in columns]] + [
+        [
+            fmt.format(result[name]) if result[name] is not None else "-"
+            for name, fmt in columns
+        ]
+        for result in results
+    ]
+    widths = [max(len(row[i]) for row in rows) for i in range(len(columns))]
+
+    for row in rows:
+        print("  ".join(cell.ljust(width) for cell, width in zip(row, widths)))
+
+
+def main():
+    args = argparse.ArgumentParser(description="Benchmark the scrapers offline")
+    args.add_argument(
+        "--scraper",
+        action="append",
+        help="The scraper to benchmark, can be repeated (default: all)",
+    )
+    args.add_argument(
+        "--record",
+        action="store_true",
+        help="Record the missing fixtures from the live sites",
+    )
+    args.add_argument("--fixtures-dir", default=FIXTURES_DIR)
+    args.add_argument("--output", help="Write the results as JSON to this file")
+    args.add_argument("--child", help=argparse.SUPPRESS)
+    args.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    args.add_argument("--today", type=Date.fromisoformat, help=argparse.SUPPRESS)
+    args = args.parse_args()
+
+    if args.child:
+        print(json.dumps(run_scraper(args.child, args.port, args.today)))
+        return
+
+    from scrape import get_scrapers
+
+    scraper_keys = args.scraper or list(get_scrapers().keys())
+    results = asyncio.run(benchmark(scraper_keys, args.fixtures_dir, args.record))
+    print_results(results)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
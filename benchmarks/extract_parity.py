@@ -0,0 +1,121 @@
+"""
+Parity check of the HTML extractor against the difflib diff it replaced.
+
+The HTML pages recorded in the fixtures of bench_scrapers (or in a cassette of scrape.py)
+are extracted with both `html_extract` and `html_extract_difflib`, each page against the
+page recorded before it like the articles of a run. The report lists, per scraper, the
+pages with an identical output, the average similarity of the outputs and the time taken.
+
+Usage:
+  python -m benchmarks.extract_parity                      # all fixtures
+  python -m benchmarks.extract_parity --cassette run.ndjson.gz
+  python -m benchmarks.extract_parity --min-similarity 0.99  # exit 1 below this (default 0.95)
+
+It exits with an error if no pages are found. The unit test of the same check on a few
+checked in pages is tests/test_html_extract.py.
+"""
+
+import argparse
+import difflib
+import glob
+import json
+import os
+import sys
+import time
+from typing import Dict, List
+from html_extractor.html_extractor import html_extract, html_extract_difflib
+from scraper.cassette import from_record, load_records
+from scraper.utils import decode_body
+from benchmarks.bench_scrapers import FIXTURES_DIR
+
+
+def load_pages(path: str) -> List[str]:
+    pages = []
+
+    for record in load_records(path).values():
+        response = from_record(record)
+
+        if response.status == 200 and "html" in (response.content_type or ""):
+            pages.append(decode_body(response.content, response.charset))
+
+    return pages
+
+
+def similarity(extracted: str, expected: str) -> float:
+    return difflib.SequenceMatcher(
+        None, extracted.splitlines(), expected.splitlines(), autojunk=False
+    ).ratio()
+
+
+def compare(pages: List[str]) -> Dict[str, float]:
+    identical = 0
+    similarities = []
+    extract_time = 0.0
+    difflib_time = 0.0
+
+    for ref_html, tgt_html in zip(pages, pages[1:]):
+        start = time.perf_counter()
+        extracted = html_extract(ref_html, tgt_html)
+        extract_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        expected = html_extract_difflib(ref_html, tgt_html)
+        difflib_time += time.perf_counter() - start
+
+        identical += extracted == expected
+        similarities.append(similarity(extracted, expected))
+
+    return {
+        "pages": len(similarities),
+        "identical": identical,
+        "similarity": (
+            round(sum(similarities) / len(similarities), 4) if similarities else 1.0
+        ),
+        "extract_time": round(extract_time, 3),
+        "difflib_time": round(difflib_time, 3),
+    }
+
+
+def main():
+    args = argparse.ArgumentParser(
+        description="Compare html_extract with the difflib extractor"
+    )
+    args.add_argument("--fixtures-dir", default=FIXTURES_DIR)
+    args.add_argument(
+        "--cassette",
+        action="append",
+        help="A cassette to read the pages from instead of the fixtures, can be repeated",
+    )
+    args.add_argument(
+        "--min-similarity",
+        type=float,
+        default=0.95,
+        help="Exit with an error if the average similarity of a file is lower (default: 0.95)",
+    )
+    args.add_argument("--output", help="Write the results as JSON to this file")
+    args = args.parse_args()
+
+    paths = args.cassette or sorted(
+        glob.glob(os.path.join(args.fixtures_dir, "*.ndjson.gz"))
+    )
+    results = {}
+
+    for path in paths:
+        name = os.path.basename(path).replace(".ndjson.gz", "")
+        results[name] = compare(load_pages(path))
+        print(name, json.dumps(results[name]))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if not any(result["pages"] for result in results.values()):
+        print(f"No recorded HTML pages found in {' '.join(paths) or args.fixtures_dir}")
+        sys.exit(1)
+
+    if any(result["similarity"] < args.min_similarity for result in results.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+import json
+import os
+import sqlite3
+from datetime import datetime as DateTime
+from typing import Dict, FrozenSet, Iterable, List, Optional
+
+
+class SiteTemplate:
+    """
+    The boilerplate of a site, learned from the text lines of its extracted pages.
+
+    The number of pages each line hash (see `line_hash`) is found in is counted, and a line
+    found in at least `min_frequency` of the pages is boilerplate. The template is used
+    once `min_pages` pages are learned. When more than `max_pages` pages are learned, the
+    counts are halved, so the lines of an old layout of the site fade out. The keys of the
+    last `max_pages` pages are kept, so a page fetched again is not counted twice.
+    """
+
+    def __init__(
+        self,
+        pages: int = 0,
+        line_counts: Optional[Dict[int, int]] = None,
+        learned_keys: Optional[List[str]] = None,
+        min_pages: int = 10,
+        min_frequency: float = 0.5,
+        max_pages: int = 200,
+    ):
+        self.pages = pages
+        self.line_counts = line_counts or {}
+        self.learned_keys = learned_keys or []
+        self.min_pages = min_pages
+        self.min_frequency = min_frequency
+        self.max_pages = max_pages
+        self.changed = False
+        self._boilerplate: Optional[FrozenSet[int]] = None
+
+    @property
+    def is_ready(self) -> bool:
+        return self.pages >= self.min_pages
+
+    def boilerplate(self) -> FrozenSet[int]:
+        """
+        Returns the hashes of the boilerplate lines.
+        """
+        if self._boilerplate is None:
+            min_count = self.min_frequency * self.pages
+            self._boilerplate = frozenset(
+                line for line, count in self.line_counts.items() if count >= min_count
+            )
+
+        return self._boilerplate
+
+    def learn(self, line_hashes: Iterable[int], key: Optional[str] = None) -> bool:
+        """
+        Counts the text lines of a page of the site, unless the page is already learned.
+
+        Args:
+          line_hashes (Iterable[int]): The hashes of the distinct text lines of the page.
+          key (Optional[str]): The key of the page, e.g. the article id.
+
+        Returns:
+          bool: True if the page is learned, False if it was learned before.
+        """
+        if key is not None:
+            if key in self.learned_keys:
+                return False
+
+            self.learned_keys = (self.learned_keys + [key])[-self.max_pages :]
+
+        self.pages += 1
+
+        for line in line_hashes:
+            self.line_counts[line] = self.line_counts.get(line, 0) + 1
+
+        if self.pages > self.max_pages:
+            self.pages //= 2
+            self.line_counts = {
+                line: count // 2
+                for line, count in self.line_counts.items()
+                if count // 2 > 0
+            }
+
+        self.changed = True
+        self._boilerplate = None
+
+        return True
+
+
+class TemplateStore:
+    """
+    A persistent store of the learned templates of the sites, keyed by scraper.
+
+    The templates are kept in a SQLite database so that the file can be restored between
+    runs, the pages learned during a run are only written on `commit()`.
+
+    Args:
+      path (str): The path of the SQLite file.
+      **template_kwargs: The arguments of the SiteTemplate, e.g. min_pages.
+    """
+
+    def __init__(self, path: str, **template_kwargs):
+        directory = os.path.dirname(path)
+
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self.template_kwargs = template_kwargs
+        self._conn = sqlite3.connect(path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS site_templates (scraper TEXT PRIMARY KEY, pages INTEGER NOT NULL, line_counts TEXT NOT NULL, learned_keys TEXT NOT NULL, updated_at TEXT NOT NULL)"
+        )
+        self._templates: Dict[str, SiteTemplate] = {}
+
+    def get(self, key: str) -> SiteTemplate:
+        """
+        Returns the template of the scraper, an empty one if none is learned yet.
+        """
+        if key not in self._templates:
+            row = self._conn.execute(
+                "SELECT pages, line_counts, learned_keys FROM site_templates WHERE scraper = ?",
+                (key,),
+            ).fetchone()
+            self._templates[key] = (
+                SiteTemplate(
+                    row[0],
+                    dict(json.loads(row[1])),
+                    json.loads(row[2]),
+                    **self.template_kwargs,
+                )
+                if row is not None
+                else SiteTemplate(**self.template_kwargs)
+            )
+
+        return self._templates[key]
+
+    def commit(self, now: Optional[DateTime] = None):
+        """
+        Writes the templates which learned pages since the last commit.
+        """
+        updated_at = (now or DateTime.now()).isoformat()
+        changed = {
+            key: template
+            for key, template in self._templates.items()
+            if template.changed
+        }
+
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO site_templates (scraper, pages, line_counts, learned_keys, updated_at) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (
+                        key,
+                        template.pages,
+                        json.dumps(list(template.line_counts.items())),
+                        json.dumps(template.learned_keys, ensure_ascii=False),
+                        updated_at,
+                    )
+                    for key, template in changed.items()
+                ],
+            )
+
+        for template in changed.values():
+            template.changed = False
+
+    def close(self):
+        self._conn.close()
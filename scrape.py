@@ -4,10 +4,44 @@ import logging
 import datetime
 from tqdm.auto import tqdm
 import json
-from typing import Dict, TYPE_CHECKING, List
+import hashlib
+import time
+import argparse
+from contextlib import asynccontextmanager
+from typing import (
+    Awaitable,
+    Dict,
+    TYPE_CHECKING,
+    List,
+    Callable,
+    Any,
+    Optional,
+    Set,
+    Tuple,
+)
+import random
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor
+import aiohttp
 import requests
 from scraper import *
-from html_extractor.html_extractor import html_extract
+from scraper.scraper import _limit_concurrency
+from scraper.seen_store import SeenStore
+from scraper.session import shared_session
+from scraper.http_cache import HTTPCache, current_http_cache, use_http_cache
+from scraper.rate_limit import RateLimiter, use_rate_limiter
+from scraper.link_cache import LinkCache, use_link_cache
+from scraper.cassette import Cassette, use_cassette
+from scraper.single_flight import RequestCoalescer, use_coalescer
+from scraper.proxy_pool import ProxyPool, use_proxy_pool
+from scraper.utils import fetch_deadline
+from scraper.stats import RunStats, record_event, record_extract, record_page_parse
+from html_extractor.html_extractor import (
+    ParsedPage,
+    extract_page,
+    parse_page,
+)
+from html_extractor.template_store import SiteTemplate, TemplateStore
 
 logger = logging.getLogger(__name__)
 
@@ -15,28 +49,61 @@ if TYPE_CHECKING:
     from scraper.scraper import ScraperOutput, Scraper
 
 PIPELINE_ENDPOINT = os.getenv("PIPELINE_ENDPOINT")
+# the articles sent in earlier runs are skipped if set
+SEEN_STORE_PATH = os.getenv("SEEN_STORE_PATH")
+# the index pages unchanged since earlier runs are skipped if set
+HTTP_CACHE_PATH = os.getenv("HTTP_CACHE_PATH")
+# the shortened links resolved in earlier runs are not resolved again if set
+LINK_CACHE_PATH = os.getenv("LINK_CACHE_PATH")
+# the boilerplate of each site is learned across runs and removed from its articles if set
+TEMPLATE_STORE_PATH = os.getenv("TEMPLATE_STORE_PATH")
+# the comma separated SOCKS or HTTP proxies the requests are sent through if set
+SCRAPER_PROXIES = [
+    proxy.strip()
+    for proxy in os.getenv("SCRAPER_PROXIES", "").split(",")
+    if proxy.strip()
+]
+# the seconds each scraper may spend fetching, its remaining fetches fail fast after it
+SCRAPER_TIME_BUDGET = float(os.getenv("SCRAPER_TIME_BUDGET", "600"))
+# the processes extracting the article text, one per CPU if not set
+EXTRACT_WORKERS = (
+    int(os.getenv("EXTRACT_WORKERS")) if os.getenv("EXTRACT_WORKERS") else None
+)
+# the per scraper performance report is written to this file if set
+RUN_REPORT_PATH = os.getenv("RUN_REPORT_PATH")
+# the performance report is also sent to the pipeline as a `run_stats` event if set
+SEND_RUN_STATS = os.getenv("SEND_RUN_STATS", "").lower() in ("1", "true", "yes")
 
 
-def is_dict_over_1mb(data: dict) -> bool:
-    json_str = json.dumps(data)
-    size_bytes = len(json_str.encode("utf-8"))
-    return (
-        size_bytes > 990_000
-    )  # 0.99 MB threshold, there a limit of 1 MB for Cloudflare Workers
+# 0.99 MB threshold, there a limit of 1 MB for Cloudflare Workers
+MAX_PAYLOAD_BYTES = 990_000
+# flush the buffered events if they are older than this (in seconds)
+BATCH_FLUSH_INTERVAL = 30.0
 
 
-def send_to_pipeline(article, pipeline_endpoint=PIPELINE_ENDPOINT):
+def serialize_event(data) -> bytes:
+    """
+    Serializes an event (or a list of events) to UTF-8 encoded JSON.
+    """
+    return json.dumps(data, ensure_ascii=False).encode("utf-8")
+
+
+def post_to_pipeline(body: bytes, pipeline_endpoint=PIPELINE_ENDPOINT):
+    """
+    Posts an already serialized JSON array of events to the pipeline.
+
+    Args:
+      body (bytes): The JSON encoded list of events.
+      pipeline_endpoint (str): The pipeline endpoint.
+
+    Returns:
+      dict: The JSON response of the pipeline.
+    """
     if not pipeline_endpoint:
         raise ValueError("PIPELINE_ENDPOINT is not set.")
 
-    if is_dict_over_1mb(article):
-        logger.warning("Article size exceeds 1MB, skipping sending to pipeline.")
-        return
-
     headers = {"Content-Type": "application/json"}
-    response = requests.post(
-        pipeline_endpoint, json=article, headers=headers, timeout=60
-    )
+    response = requests.post(pipeline_endpoint, data=body, headers=headers, timeout=60)
 
     if response.status_code != 200:
         raise requests.exceptions.HTTPError(
@@ -46,121 +113,877 @@ def send_to_pipeline(article, pipeline_endpoint=PIPELINE_ENDPOINT):
     return response.json()
 
 
-def extract_content_from_html(articles: List["ScraperOutput"]):
+def _json_string_size(text: str) -> int:
+    # serialized JSON has no raw control characters, only quotes and backslashes are escaped
+    return len(text.encode("utf-8")) + text.count('"') + text.count("\\")
+
+
+def split_event(event: dict, body: bytes, max_bytes: int) -> List[bytes]:
+    """
+    Splits a serialized event that is too large to be sent into part events.
+
+    Each part event carries a slice of the serialized event in `data`, along with the
+    `part` id (shared by all parts), index and count, the parts are joined and parsed
+    again when the data is archived.
+
+    Args:
+      event (dict): The event, only the fields other than the payload are copied to the parts.
+      body (bytes): The serialized event.
+      max_bytes (int): The maximum size of a serialized part event.
+
+    Returns:
+      List[bytes]: The serialized part events.
     """
-    Extracts text content from HTML articles using the html_extract function.
+    text = body.decode("utf-8")
+    part_id = hashlib.sha1(body).hexdigest()
+    envelope = {key: value for key, value in event.items() if key != "payload"}
+    envelope["event"] = f"{event['event']}_part"
+
+    def serialize_envelope(index: int, count: int) -> bytes:
+        # the data is the last field, so the serialized part ends with `"data": ""}`
+        return serialize_event(
+            {
+                **envelope,
+                "part": {"id": part_id, "index": index, "count": count},
+                "data": "",
+            }
+        )[:-2]
+
+    # reserve enough room for the part numbers
+    budget = max_bytes - len(serialize_envelope(99999, 99999)) - 2
+    chunks = []
+    start = 0
+
+    while start < len(text):
+        # each character takes at least one byte, find the longest slice within the budget
+        low, high = start + 1, min(len(text), start + budget)
+
+        while low < high:
+            middle = (low + high + 1) // 2
+
+            if _json_string_size(text[start:middle]) <= budget:
+                low = middle
+            else:
+                high = middle - 1
+
+        chunks.append(text[start:low])
+        start = low
+
+    return [
+        serialize_envelope(index, len(chunks))
+        + chunk.replace("\\", "\\\\").replace('"', '\\"').encode("utf-8")
+        + b'"}'
+        for index, chunk in enumerate(chunks)
+    ]
+
+
+class EventBatcher:
     """
-    extracted_articles = []
+    Packs pipeline events into as few requests as possible.
 
-    for index, article in enumerate(articles):
-        if article is not None and isinstance(article.content, str):
-            prev_index = index - 1 if index > 0 else len(articles) - 1
-            prev_article = articles[prev_index]
+    Each event is serialized once when it is added, the buffered events are sent as a
+    single JSON array when the next event would not fit under `max_bytes`, when the
+    oldest buffered event is older than `flush_interval` seconds, or on `flush()`. Events
+    added in an event loop are flushed by a timer once they are too old, even if no other
+    event is added.
+    """
 
-            if prev_article is None:
-                logger.warning(
-                    f"No previous article found for index {index}. Skipping HTML extraction."
-                )
-                continue
+    def __init__(
+        self,
+        sink: Callable[[bytes], Any] = post_to_pipeline,
+        max_bytes: int = MAX_PAYLOAD_BYTES,
+        flush_interval: float = BATCH_FLUSH_INTERVAL,
+    ):
+        self.sink = sink
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self._events: List[bytes] = []
+        self._size = 2  # the enclosing brackets
+        self._first_added_at: Optional[float] = None
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def add(self, event: dict):
+        """
+        Adds an event to the batch, sending the batch if it is full or too old.
+
+        Args:
+          event (dict): The event to send.
+        """
+        body = serialize_event(event)
+        record_event(len(body))
+
+        if len(body) + 2 > self.max_bytes:
+            logger.warning("Article size exceeds 1MB, sending it in parts.")
+
+            for part in split_event(event, body, self.max_bytes - 2):
+                self._add(part)
+
+            return
+
+        self._add(body)
+
+    def _add(self, body: bytes):
+        # the comma separator is only needed if there are buffered events
+        if self._events and self._size + len(body) + 1 > self.max_bytes:
+            self.flush()
+
+        self._size += len(body) + (1 if self._events else 0)
+        self._events.append(body)
+
+        if self._first_added_at is None:
+            self._first_added_at = time.monotonic()
+            self._schedule_flush()
+        elif time.monotonic() - self._first_added_at >= self.flush_interval:
+            self.flush()
+
+    def _schedule_flush(self):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # without an event loop, the age of the batch is only checked when adding events
+            return
+
+        self._timer = loop.call_later(self.flush_interval, self.flush)
+
+    def flush(self):
+        """
+        Sends all buffered events.
+        """
+        if not self._events:
+            return
+
+        body = b"[" + b",".join(self._events) + b"]"
+        self._events = []
+        self._size = 2
+        self._first_added_at = None
+
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        self.sink(body)
+
+
+class PipelineSender:
+    """
+    Sends event batches to the pipeline in the background.
+
+    All requests share one keep-alive session, at most `max_in_flight` requests are sent
+    at the same time, and rate limited (429) or failed (5xx) requests are retried with
+    exponential backoff. Call `drain()` to wait for the submitted batches and `close()`
+    to release the session.
+    """
+
+    def __init__(
+        self,
+        pipeline_endpoint=PIPELINE_ENDPOINT,
+        max_in_flight: int = 4,
+        max_retries: int = 5,
+        backoff: float = 1.0,
+        timeout: int = 60,
+        stats: Optional[RunStats] = None,
+    ):
+        if not pipeline_endpoint:
+            raise ValueError("PIPELINE_ENDPOINT is not set.")
+
+        self.pipeline_endpoint = pipeline_endpoint
+        self.stats = stats
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=max_in_flight, keepalive_timeout=60),
+            timeout=aiohttp.ClientTimeout(total=timeout),
+            headers={"Content-Type": "application/json"},
+        )
+        self._tasks: Set[asyncio.Task] = set()
+        self._errors: List[Exception] = []
+
+    def submit(self, body: bytes):
+        """
+        Schedules a serialized batch of events to be sent, without waiting for it.
+
+        Args:
+          body (bytes): The JSON encoded list of events.
+        """
+        task = asyncio.ensure_future(self._send(body))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, body: bytes):
+        async with self._semaphore:
+            for attempt in range(self.max_retries + 1):
+                retry_after = None
+                succeeded = False
+                start = time.perf_counter()
 
-            ref_content = (
-                prev_article.content if isinstance(prev_article.content, str) else ""
+                try:
+                    async with self._session.post(
+                        self.pipeline_endpoint, data=body
+                    ) as response:
+                        if response.status == 200:
+                            succeeded = True
+                            return
+
+                        error = requests.exceptions.HTTPError(
+                            f"Pipeline request failed with status code {response.status}: {await response.text()}"
+                        )
+
+                        # only rate limited and server errors are worth retrying
+                        if response.status != 429 and response.status < 500:
+                            break
+
+                        retry_after = response.headers.get("Retry-After")
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    error = e
+                finally:
+                    if self.stats is not None:
+                        self.stats.record_send(
+                            time.perf_counter() - start, len(body), error=not succeeded
+                        )
+
+                if attempt < self.max_retries:
+                    delay = self.backoff * 2**attempt + random.uniform(0, self.backoff)
+
+                    if retry_after is not None and retry_after.isdigit():
+                        delay = max(delay, int(retry_after))
+
+                    logger.warning(f"{error}, retrying in {delay:.1f}s...")
+                    await asyncio.sleep(delay)
+
+        logger.error(f"Error sending events to pipeline: {error}")
+        self._errors.append(error)
+
+    async def drain(self):
+        """
+        Waits for all submitted batches to be sent.
+
+        Raises:
+          RuntimeError: If any batch could not be sent.
+        """
+        while self._tasks:
+            await asyncio.gather(*self._tasks)
+
+        if self._errors:
+            errors, self._errors = self._errors, []
+            raise RuntimeError(
+                f"Failed to send {len(errors)} batch(es) to the pipeline: {errors[-1]}"
             )
 
-            if not ref_content:
-                logger.warning(
-                    f"No reference content found for the article at index {index}. Skipping HTML extraction."
-                )
+    async def close(self):
+        """
+        Closes the underlying session, pending batches are not waited for.
+        """
+        for task in list(self._tasks):
+            task.cancel()
+
+        await self._session.close()
+
+
+def _to_payload(article: "ScraperOutput") -> dict:
+    payload = article.to_dict().copy()
+    payload["date"] = article.date.isoformat() + "Z" if article.date else None
+
+    return payload
+
+
+def _to_extracted_article(article: "ScraperOutput", extracted: str) -> dict:
+    extracted_article = _to_payload(article)
+    extracted_article["extracted"] = extracted
+
+    return extracted_article
+
+
+def _timed_parse_page(html_text: str) -> Tuple[ParsedPage, float]:
+    # measured in the worker, the time waiting for a free worker is not counted
+    start = time.perf_counter()
+    page = parse_page(html_text)
+
+    return page, time.perf_counter() - start
+
+
+async def parse_article(
+    article: "ScraperOutput", executor: Optional[Executor] = None
+) -> Optional[ParsedPage]:
+    """
+    Parses the HTML content of an article in the executor.
+
+    Args:
+      article (ScraperOutput): The article to parse.
+      executor (Optional[Executor]): The executor running the parsing, the default thread pool if None.
+
+    Returns:
+      Optional[ParsedPage]: The parsed page, or None if the content is not HTML.
+    """
+    if not isinstance(article.content, str):
+        return None
+
+    loop = asyncio.get_running_loop()
+    page, parse_time = await loop.run_in_executor(
+        executor, _timed_parse_page, article.content
+    )
+    record_page_parse(parse_time)
+
+    return page
+
+
+def _is_template_ready(template: Optional[SiteTemplate]) -> bool:
+    return template is not None and template.is_ready
+
+
+async def extract_article(
+    article: "ScraperOutput",
+    page: Awaitable[Optional[ParsedPage]],
+    ref_page: Optional[Awaitable[Optional[ParsedPage]]] = None,
+    template: Optional[SiteTemplate] = None,
+) -> Optional[dict]:
+    """
+    Extracts the text content of a parsed HTML article.
+
+    The boilerplate of the learned template of the source is removed if it is ready,
+    otherwise the parsed page of another article of the same source is used as the
+    reference. The template learns the lines of the article either way.
+
+    Args:
+      article (ScraperOutput): The article to extract.
+      page (Awaitable[Optional[ParsedPage]]): The parsed page of the article, see `parse_article`.
+      ref_page (Optional[Awaitable[Optional[ParsedPage]]]): The parsed page of the reference article.
+      template (Optional[SiteTemplate]): The learned template of the source.
+
+    Returns:
+      Optional[dict]: The extracted article, or None if it cannot be extracted.
+    """
+    page = await page
+
+    if page is None:
+        return None
+
+    boilerplate = template.boilerplate() if _is_template_ready(template) else None
+    ref_page = await ref_page if boilerplate is None and ref_page is not None else None
+
+    if boilerplate is None and ref_page is None:
+        logger.warning(
+            f"No reference content found for the article {article.title}. Skipping HTML extraction."
+        )
+        return None
+
+    start = time.perf_counter()
+    extracted = extract_page(page, ref_page, boilerplate)
+    record_extract(time.perf_counter() - start)
+
+    if template is not None:
+        template.learn(page.line_hashes, key=article.id)
+
+    return _to_extracted_article(article, extracted)
+
+
+async def learn_article(
+    article: "ScraperOutput",
+    page: Awaitable[Optional[ParsedPage]],
+    template: SiteTemplate,
+):
+    """
+    Learns the lines of an article whose body is extracted by the scraper, so that the
+    template of the source is ready once the body selector misses, e.g. after the layout
+    of the site changes.
+
+    Args:
+      article (ScraperOutput): The article to learn.
+      page (Awaitable[Optional[ParsedPage]]): The parsed page of the article, see `parse_article`.
+      template (SiteTemplate): The learned template of the source.
+    """
+    page = await page
+
+    if page is not None:
+        template.learn(page.line_hashes, key=article.id)
+
+
+def _discard_cached_index(scraper: "Scraper"):
+    # the index of a failed scraper is fetched in full on the next run, so its articles are retried
+    http_cache = current_http_cache()
+
+    if http_cache is not None:
+        http_cache.discard(scraper.index_url)
+
+
+async def process_scraper(
+    key: str,
+    scraper: "Scraper",
+    batcher: EventBatcher,
+    today: datetime.date,
+    timestamp: str,
+    executor: Optional[Executor] = None,
+    template: Optional[SiteTemplate] = None,
+) -> bool:
+    """
+    Scrapes a single source, extracts the article content and sends the articles to the pipeline.
+
+    The articles are extracted and sent as soon as they are fetched, the articles whose
+    body is extracted by the scraper are sent as is, and learned by the template until it
+    is ready. Once the template of the source is learned, its boilerplate is removed from
+    each HTML article, until then each article is diffed against the previously fetched
+    one and the first one against the last one. The HTML extraction is run in the executor so that the other scrapers
+    sharing the event loop can keep fetching.
+
+    Args:
+      key (str): The name of the scraper, used in the pipeline events.
+      scraper (Scraper): The scraper to run.
+      batcher (EventBatcher): The batcher collecting the events sent to the pipeline.
+      today (datetime.date): Only articles published on this date are sent.
+      timestamp (str): The timestamp of the run.
+      executor (Optional[Executor]): The executor running the HTML extraction, the default thread pool if None.
+      template (Optional[SiteTemplate]): The learned template of the source, if any.
+
+    Returns:
+      bool: True if the scraper succeeded, False otherwise.
+    """
+
+    def send(article: "ScraperOutput", payload: dict):
+        # only get article published in today
+        if (
+            payload["date"]
+            and datetime.datetime.fromisoformat(payload["date"].replace("Z", "")).date()
+            != today
+        ):
+            logger.warning(
+                f"Article {payload['title']} is not published today. Skipping..."
+            )
+            return
+
+        batcher.add(
+            {
+                "event": "scraping",
+                "scraper": key,
+                "timestamp": timestamp,
+                "payload": payload,
+            }
+        )
+
+        # an article extracted without text is not archived, it is fetched again next run
+        if "extracted" not in payload or payload["extracted"].strip():
+            scraper.mark_sent(article)
+
+    async def extract_and_send(
+        article: "ScraperOutput",
+        page: asyncio.Future,
+        ref_article: Optional["ScraperOutput"],
+        ref_page: Optional[asyncio.Future],
+    ):
+        if (
+            ref_page is None
+            and ref_article is not None
+            and not _is_template_ready(template)
+        ):
+            # the reference was not parsed as a target, e.g. its body was extracted by the scraper
+            ref_page = parse(ref_article)
+
+        extracted_article = await extract_article(article, page, ref_page, template)
+
+        if extracted_article is not None:
+            send(article, extracted_article)
+
+    def parse(article: "ScraperOutput") -> asyncio.Future:
+        # each page is parsed once, as the target and as the reference of the next article
+        return asyncio.ensure_future(parse_article(article, executor))
+
+    # limit the articles waiting for extraction, so they do not pile up in memory
+    max_pending = 2 * scraper.num_proc
+    pending = set()
+
+    async def wait_pending():
+        nonlocal pending
+
+        if len(pending) >= max_pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+
+            for task in done:
+                task.result()
+
+    try:
+        num_articles = 0
+        first_article = prev_article = None
+        first_page = prev_page = None
+
+        # a learned template needs no other article as the reference
+        async for article in scraper.iter_articles(
+            published_on=today, keep_reference=not _is_template_ready(template)
+        ):
+            if article.reference_only:
+                # sent in an earlier run, only the reference of the article before or after it
+                prev_article, prev_page = article, None
                 continue
 
-            # Extract text from HTML content
-            extracted_article = article.to_dict().copy()
-            extracted_article["extracted"] = html_extract(ref_content, article.content)
-            extracted_article["date"] = (
-                article.date.isoformat() + "Z" if article.date else None
+            num_articles += 1
+
+            if scraper.content_type != "text/html":
+                send(article, _to_payload(article))
+                continue
+
+            page = None
+
+            if article.extracted is not None:
+                # the scraper extracted the body, the article is still the reference of the next one
+                send(article, _to_extracted_article(article, article.extracted))
+
+                if template is not None and not template.is_ready:
+                    # the template is the fallback of the articles the selector misses
+                    await wait_pending()
+                    page = parse(article)
+                    pending.add(
+                        asyncio.ensure_future(learn_article(article, page, template))
+                    )
+            elif prev_article is None and not _is_template_ready(template):
+                first_article = article
+                first_page = page = parse(article)
+            else:
+                await wait_pending()
+                page = parse(article)
+                pending.add(
+                    asyncio.ensure_future(
+                        extract_and_send(article, page, prev_article, prev_page)
+                    )
+                )
+
+            prev_article, prev_page = article, page
+
+        if first_article is not None:
+            pending.add(
+                asyncio.ensure_future(
+                    extract_and_send(first_article, first_page, prev_article, prev_page)
+                )
             )
-            extracted_articles.append(extracted_article)
-
-    return extracted_articles
-
-
-def main(num_proc=3):
-    scrapers: Dict[str, Scraper] = {
-        # "InMediaHKNet": InMediaHKNetTelegramScraper(num_proc=num_proc), # Cloudflare blocked
-        # "RFACantonese": RFACantoneseScraper(num_proc=num_proc),
-        "881903": C881903Scraper(num_proc=num_proc),
-        "RTHKChinese": RTHKChineseScraper(num_proc=num_proc),
-        "RTHKEnglish": RTHKEnglishScraper(num_proc=num_proc),
-        "HK01": HK01Scraper(num_proc=num_proc),
-        "HeadlineNews": HeadlineNewsScraper(num_proc=num_proc),
-        "HeadlineColumns": HeadlineColumnsScraper(num_proc=num_proc),
-        "GOVHK": GovHKScraper(num_proc=num_proc),
-        "On.cc": ONCCScraper(num_proc=num_proc),
-        "SCMP": SCMPScraper(num_proc=num_proc),
-        "MingPao": MingPaoScraper(num_proc=num_proc),
-        "hket": HKETScraper(num_proc=num_proc),
-        "OrangeNews": OrangeNewsScraper(num_proc=num_proc),
-        "TVBNews": TVBNewsScraper(num_proc=num_proc),
-        "NowNews": NowNewsScraper(num_proc=num_proc),
-        "WeekendHK": WeekendHKScraper(num_proc=num_proc),
-        "UnwireHK": UnwireScraper(num_proc=num_proc),
-        "AM730": AM730Scraper(num_proc=num_proc),
-        "ULifestyleScraper": ULifestyleScraper(num_proc=num_proc),
-        "TheStandard": TheStandardScraper(num_proc=num_proc),
-        "EdigestHK": EdigestHKScraper(num_proc=num_proc),
-        "MenClub": MenClubScraper(num_proc=num_proc),
-        "MetroRadio": MetroRadioScraper(num_proc=num_proc),
-        "WenWeiPo": WenWeiPoScraper(num_proc=num_proc),
-    }
+
+        await asyncio.gather(*pending)
+
+        if scraper.num_failed > 0:
+            # the index is fetched in full on the next run, so the failed articles are retried
+            logger.warning(f"{scraper.num_failed} articles of {key} failed.")
+            _discard_cached_index(scraper)
+
+        if num_articles == 0:
+            if scraper.index_not_modified or scraper.num_skipped > 0:
+                logger.info(f"No new articles found for {key}.")
+                return True
+
+            logger.error(f"No articles found for {key}. Skipping...")
+            _discard_cached_index(scraper)
+            return False
+
+        scraper.mark_seen()
+
+        return True
+    except Exception as e:
+        logger.error(f"Error scraping {key}: {e}")
+        _discard_cached_index(scraper)
+        return False
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def run_scrapers(
+    scrapers: Dict[str, "Scraper"],
+    batcher: EventBatcher,
+    today: datetime.date,
+    timestamp: str,
+    max_concurrent_scrapers: int = 8,
+    executor: Optional[Executor] = None,
+    run_stats: Optional[RunStats] = None,
+    scraper_budget: Optional[float] = None,
+    template_store: Optional[TemplateStore] = None,
+) -> List[str]:
+    """
+    Runs all scrapers concurrently in the current event loop.
+
+    A failing scraper does not affect the others, it is only reported in the returned list.
+    Once a scraper has run for `scraper_budget` seconds, its remaining fetches fail without
+    sending requests, and the articles fetched so far are still sent.
+
+    Args:
+      scrapers (Dict[str, Scraper]): The scrapers to run, keyed by name.
+      batcher (EventBatcher): The batcher collecting the events sent to the pipeline.
+      today (datetime.date): Only articles published on this date are sent.
+      timestamp (str): The timestamp of the run.
+      max_concurrent_scrapers (int): The maximum number of scrapers running at the same time.
+      executor (Optional[Executor]): The executor running the HTML extraction.
+      run_stats (Optional[RunStats]): If set, the performance counters of each scraper are recorded in it.
+      scraper_budget (Optional[float]): The time budget of each scraper in seconds, no limit if None.
+      template_store (Optional[TemplateStore]): If set, the HTML articles are extracted with the learned templates of the scrapers.
+
+    Returns:
+      List[str]: The names of the scrapers that failed.
+    """
+    run_stats = run_stats or RunStats()
+
+    async def run(key: str):
+        with run_stats.track(key) as stats, fetch_deadline(scraper_budget):
+            succeeded = await process_scraper(
+                key,
+                scrapers[key],
+                batcher,
+                today,
+                timestamp,
+                executor=executor,
+                template=(
+                    template_store.get(key) if template_store is not None else None
+                ),
+            )
+            stats.failed = not succeeded
+
+        return key, succeeded
+
     failed_scrapers = []
-    now = datetime.datetime.now(datetime.timezone.utc)
+
+    with tqdm(total=len(scrapers), desc="Scraping") as progress:
+        for task in asyncio.as_completed(
+            _limit_concurrency(
+                [run(key) for key in scrapers.keys()],
+                concurrency=max_concurrent_scrapers,
+            )
+        ):
+            key, succeeded = await task
+
+            if not succeeded:
+                failed_scrapers.append(key)
+
+            progress.update(1)
+
+    # keep the report in the same order as the scrapers
+    return [key for key in scrapers.keys() if key in failed_scrapers]
+
+
+@asynccontextmanager
+async def _fetch_context(
+    http_cache: Optional[HTTPCache],
+    rate_limiter: Optional[RateLimiter],
+    link_cache: Optional[LinkCache],
+    cassette: Optional[Cassette],
+    proxy_pool: Optional[ProxyPool],
+):
+    # the HTTP session, caches, rate limiter and proxies shared by the fetches of all scrapers
+    with use_http_cache(http_cache), use_rate_limiter(rate_limiter):
+        with use_link_cache(link_cache), use_cassette(cassette):
+            with use_coalescer(RequestCoalescer()):
+                async with shared_session(), use_proxy_pool(proxy_pool):
+                    yield
+
+
+def _discard_batch(body: bytes):
+    # the events of a replayed run are batched but not sent
+    pass
+
+
+async def run_pipeline(
+    scrapers: Dict[str, "Scraper"],
+    today: datetime.date,
+    timestamp: str,
+    max_concurrent_scrapers: int = 8,
+    seen_store: Optional[SeenStore] = None,
+    extract_workers: Optional[int] = None,
+    http_cache: Optional[HTTPCache] = None,
+    rate_limiter: Optional[RateLimiter] = None,
+    scraper_budget: Optional[float] = None,
+    link_cache: Optional[LinkCache] = None,
+    cassette: Optional[Cassette] = None,
+    proxy_pool: Optional[ProxyPool] = None,
+    template_store: Optional[TemplateStore] = None,
+) -> List[str]:
+    """
+    Runs all scrapers and sends their articles to the pipeline while they are scraping.
+
+    The scrapers share a pooled HTTP session, the per host rate limiter and the responses
+    of identical requests, the HTML extraction is run in a pool of `extract_workers`
+    processes (one per CPU by default), the articles are only recorded in the seen store,
+    and the index pages in the HTTP cache, once they are all sent.
+    The requests are sent through the proxies of the pool if set.
+    The HTML articles are extracted with the templates of the store if set, and the pages
+    learned are written once the articles are sent.
+    The responses are recorded to the cassette if set, or served from it in replay mode,
+    in which case the events are not sent.
+    The performance report of the run is written to `RUN_REPORT_PATH` if set.
+
+    Returns:
+      List[str]: The names of the scrapers that failed.
+    """
+    run_stats = RunStats()
+    replaying = cassette is not None and cassette.replaying
+    sender = PipelineSender(stats=run_stats) if not replaying else None
+    batcher = EventBatcher(sink=sender.submit if sender is not None else _discard_batch)
+    # spawn the workers instead of forking the process with a running event loop
+    executor = ProcessPoolExecutor(
+        max_workers=extract_workers or os.cpu_count(),
+        mp_context=multiprocessing.get_context("spawn"),
+    )
+
+    try:
+        async with _fetch_context(
+            http_cache, rate_limiter, link_cache, cassette, proxy_pool
+        ):
+            failed_scrapers = await run_scrapers(
+                scrapers,
+                batcher=batcher,
+                today=today,
+                timestamp=timestamp,
+                max_concurrent_scrapers=max_concurrent_scrapers,
+                executor=executor,
+                run_stats=run_stats,
+                scraper_budget=scraper_budget,
+                template_store=template_store,
+            )
+
+        if SEND_RUN_STATS:
+            batcher.add(
+                {
+                    "event": "run_stats",
+                    "timestamp": timestamp,
+                    "payload": run_stats.to_dict(),
+                }
+            )
+
+        # send the remaining events
+        batcher.flush()
+
+        if sender is not None:
+            await sender.drain()
+
+        if seen_store is not None:
+            seen_store.commit()
+
+        if http_cache is not None:
+            http_cache.commit()
+
+        if link_cache is not None:
+            link_cache.commit()
+
+        if template_store is not None:
+            template_store.commit()
+    finally:
+        if sender is not None:
+            await sender.close()
+
+        executor.shutdown()
+
+        if RUN_REPORT_PATH:
+            run_stats.write(RUN_REPORT_PATH)
+
+    return failed_scrapers
+
+
+def get_scrapers(**scraper_kwargs) -> Dict[str, "Scraper"]:
+    """
+    Creates the scrapers run by the pipeline, keyed by name.
+
+    Args:
+      **scraper_kwargs: The arguments passed to every scraper, e.g. num_proc.
+    """
+    return {
+        # "InMediaHKNet": InMediaHKNetTelegramScraper(**scraper_kwargs), # Cloudflare blocked
+        # "RFACantonese": RFACantoneseScraper(**scraper_kwargs),
+        "881903": C881903Scraper(**scraper_kwargs),
+        "RTHKChinese": RTHKChineseScraper(**scraper_kwargs),
+        "RTHKEnglish": RTHKEnglishScraper(**scraper_kwargs),
+        "HK01": HK01Scraper(**scraper_kwargs),
+        "HeadlineNews": HeadlineNewsScraper(**scraper_kwargs),
+        "HeadlineColumns": HeadlineColumnsScraper(**scraper_kwargs),
+        "GOVHK": GovHKScraper(**scraper_kwargs),
+        "On.cc": ONCCScraper(**scraper_kwargs),
+        "SCMP": SCMPScraper(**scraper_kwargs),
+        "MingPao": MingPaoScraper(**scraper_kwargs),
+        "hket": HKETScraper(**scraper_kwargs),
+        "OrangeNews": OrangeNewsScraper(**scraper_kwargs),
+        "TVBNews": TVBNewsScraper(**scraper_kwargs),
+        "NowNews": NowNewsScraper(**scraper_kwargs),
+        "WeekendHK": WeekendHKScraper(**scraper_kwargs),
+        "UnwireHK": UnwireScraper(**scraper_kwargs),
+        "AM730": AM730Scraper(**scraper_kwargs),
+        "ULifestyleScraper": ULifestyleScraper(**scraper_kwargs),
+        "TheStandard": TheStandardScraper(**scraper_kwargs),
+        "EdigestHK": EdigestHKScraper(**scraper_kwargs),
+        "MenClub": MenClubScraper(**scraper_kwargs),
+        "MetroRadio": MetroRadioScraper(**scraper_kwargs),
+        "WenWeiPo": WenWeiPoScraper(**scraper_kwargs),
+    }
+
+
+def main(
+    num_proc=3,
+    max_concurrent_scrapers=8,
+    extract_workers: Optional[int] = EXTRACT_WORKERS,
+    record: Optional[str] = None,
+    replay: Optional[str] = None,
+):
+    """
+    Runs the pipeline.
+
+    Args:
+      extract_workers (Optional[int]): The processes extracting the article text, one per CPU if None.
+      record (Optional[str]): If set, the requests and responses of the run are recorded to this cassette file.
+      replay (Optional[str]): If set, the run is served from this cassette file, without network or sending to the pipeline.
+    """
+    cassette = None
+
+    if record or replay:
+        cassette = Cassette(record or replay, replay=bool(replay))
+        # the persistent stores would change the requests between the recorded and replayed runs
+        seen_store = http_cache = link_cache = template_store = None
+    else:
+        seen_store = SeenStore(SEEN_STORE_PATH) if SEEN_STORE_PATH else None
+        http_cache = HTTPCache(HTTP_CACHE_PATH) if HTTP_CACHE_PATH else None
+        link_cache = LinkCache(LINK_CACHE_PATH) if LINK_CACHE_PATH else None
+        template_store = (
+            TemplateStore(TEMPLATE_STORE_PATH) if TEMPLATE_STORE_PATH else None
+        )
+
+    # start with num_proc requests in flight per host and adapt to how fast each host responds
+    rate_limiter = RateLimiter(initial_concurrency=num_proc)
+    proxy_pool = ProxyPool(SCRAPER_PROXIES) if SCRAPER_PROXIES else None
+    scrapers = get_scrapers(num_proc=num_proc, seen_store=seen_store)
+    now = (
+        cassette.recorded_at
+        if cassette is not None
+        else datetime.datetime.now(datetime.timezone.utc)
+    )
     today = now.date()
     timestamp = now.isoformat() + "Z"
 
-    for key in tqdm(scrapers.keys(), desc="Scraping"):
-        scraper = scrapers[key]
+    try:
+        failed_scrapers = asyncio.run(
+            run_pipeline(
+                scrapers,
+                today=today,
+                timestamp=timestamp,
+                max_concurrent_scrapers=max_concurrent_scrapers,
+                seen_store=seen_store,
+                extract_workers=extract_workers,
+                http_cache=http_cache,
+                rate_limiter=rate_limiter,
+                scraper_budget=SCRAPER_TIME_BUDGET,
+                link_cache=link_cache,
+                cassette=cassette,
+                proxy_pool=proxy_pool,
+                template_store=template_store,
+            )
+        )
+    finally:
+        if cassette is not None and cassette.replaying:
+            logger.info(f"{cassette.misses} requests were not found in {replay}")
+        elif cassette is not None:
+            cassette.save()
+            logger.info(f"Recorded {len(cassette.records)} requests to {record}")
 
-        try:
-            articles = asyncio.run(scraper.get_articles())
+    if seen_store is not None:
+        seen_store.close()
 
-            if len(articles) == 0:
-                logger.error(f"No articles found for {key}. Skipping...")
-                failed_scrapers.append(key)
-                continue
+    if http_cache is not None:
+        http_cache.close()
 
-            # extract article content from HTML
-            if scraper.content_type == "text/html":
-                articles = extract_content_from_html(articles)
-
-            # send to Cloudflare pipeline
-            for article in articles:
-                # only get article published in today
-                if (
-                    article["date"]
-                    and datetime.datetime.fromisoformat(
-                        article["date"].replace("Z", "")
-                    ).date()
-                    != today
-                ):
-                    logger.warning(
-                        f"Article {article['title']} is not published today. Skipping..."
-                    )
-                    continue
-
-                send_to_pipeline(
-                    [
-                        {
-                            "event": "scraping",
-                            "scraper": key,
-                            "timestamp": timestamp,
-                            "payload": article,
-                        }
-                    ],
-                )
+    if link_cache is not None:
+        link_cache.close()
 
-        except Exception as e:
-            logger.error(f"Error scraping {key}: {e}")
-            failed_scrapers.append(key)
+    if template_store is not None:
+        template_store.close()
 
     if failed_scrapers:
         raise RuntimeError(
@@ -169,4 +992,26 @@ def main(num_proc=3):
 
 
 if __name__ == "__main__":
-    main()
+    args = argparse.ArgumentParser(
+        description="Scrape the sources and send the articles to the pipeline"
+    )
+    args.add_argument(
+        "--extract-workers",
+        type=int,
+        default=EXTRACT_WORKERS,
+        help="The processes extracting the article text, one per CPU by default",
+    )
+    mode = args.add_mutually_exclusive_group()
+    mode.add_argument(
+        "--record",
+        metavar="CASSETTE",
+        help="Record the requests and responses of the run to this .ndjson.gz file",
+    )
+    mode.add_argument(
+        "--replay",
+        metavar="CASSETTE",
+        help="Run from the responses recorded in this file, without network or sending to the pipeline",
+    )
+    args = args.parse_args()
+
+    main(extract_workers=args.extract_workers, record=args.record, replay=args.replay)
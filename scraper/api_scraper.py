@@ -1,4 +1,6 @@
 from scraper.utils import fetch_json
+from scraper.http_cache import NotModified
+from datetime import datetime as DateTime
 from typing import TYPE_CHECKING, Optional, Union, Callable
 from scraper.scraper import Scraper, ScraperOutput
 
@@ -52,6 +54,7 @@ class APIScraper(Scraper):
                     "Content-Type": self.fetch_index_content_type,
                 },
                 body=self.fetch_index_body,
+                conditional=True,
             )
 
             list_items = (
@@ -61,6 +64,8 @@ class APIScraper(Scraper):
             )
 
             return list_items
+        except NotModified:
+            raise
         except Exception as e:
             print("Error", e)
             return []
@@ -92,6 +97,16 @@ class APIScraper(Scraper):
 
         return value
 
+    def get_index_key(self, item: dict) -> Optional[str]:
+        id_value = self._get_value(item, self.item_id_selector)
+
+        return str(id_value) if id_value is not None else None
+
+    def get_index_date(self, item: dict) -> Optional[DateTime]:
+        date_value = self._get_value(item, self.item_date_selector)
+
+        return self._parse_date(date_value) if date_value else None
+
     def parse_article(self, item: dict) -> ScraperOutput:
         """
         Parses an article from the given index item.
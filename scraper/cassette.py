@@ -0,0 +1,173 @@
+import base64
+import gzip
+import json
+import os
+import re
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime as DateTime, timezone
+from typing import Dict, List, NamedTuple, Optional
+
+
+class CassetteMiss(Exception):
+    """
+    Raised in replay mode when a request is not recorded in the cassette.
+    """
+
+
+class RecordedResponse(NamedTuple):
+    url: str  # the final URL, after the redirects
+    status: int
+    content_type: Optional[str]
+    content: bytes
+
+    @property
+    def charset(self) -> Optional[str]:
+        match = re.search(r"charset=[\"']?([\w.:-]+)", self.content_type or "")
+
+        return match.group(1) if match is not None else None
+
+
+def request_key(method: str, url: str, body=None) -> str:
+    """
+    Returns the key of a request in a cassette.
+
+    The dates in daily index URLs (e.g. on.cc) are ignored, so a cassette can be replayed
+    on another day.
+    """
+    url = re.sub(r"(?<=/)\d{8}(?=/)", "{date}", str(url))
+
+    return f"{method.upper()} {url} {body if body is not None else ''}"
+
+
+def _read_lines(path: str) -> List[dict]:
+    if not os.path.exists(path):
+        return []
+
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def load_records(path: str) -> Dict[str, dict]:
+    """
+    Loads the records of a cassette, keyed by `request_key`.
+
+    Each line of the gzipped NDJSON file is a record with the method, url and body of the
+    request, and the final_url, status, content_type and base64 content of the response.
+    An optional first line holds the metadata of the recording, e.g. `recorded_at`.
+    """
+    return _by_request_key(_read_lines(path))
+
+
+def _by_request_key(lines: List[dict]) -> Dict[str, dict]:
+    return {
+        request_key(record["method"], record["url"], record["body"]): record
+        for record in lines
+        if "method" in record
+    }
+
+
+def save_records(path: str, records: Dict[str, dict], metadata: Optional[dict] = None):
+    directory = os.path.dirname(path)
+
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        if metadata is not None:
+            f.write(json.dumps(metadata, ensure_ascii=False) + "\n")
+
+        for record in records.values():
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def to_record(method: str, url: str, body, response: RecordedResponse) -> dict:
+    return {
+        "method": method.upper(),
+        "url": str(url),
+        "body": str(body) if body is not None else None,
+        "final_url": response.url,
+        "status": response.status,
+        "content_type": response.content_type,
+        "content": base64.b64encode(response.content).decode("ascii"),
+    }
+
+
+def from_record(record: dict) -> RecordedResponse:
+    return RecordedResponse(
+        record.get("final_url") or record["url"],
+        record["status"],
+        record.get("content_type"),
+        base64.b64decode(record["content"]),
+    )
+
+
+class Cassette:
+    """
+    The requests and responses of a run, recorded to or replayed from a gzipped NDJSON file.
+
+    In record mode the responses fetched are kept and written on `save()`. In replay mode
+    the responses are served from the file, and CassetteMiss is raised for the requests
+    which were not recorded.
+    """
+
+    def __init__(self, path: str, replay: bool = False):
+        self.path = path
+        self.replaying = replay
+        self.records: Dict[str, dict] = {}
+        self.misses = 0
+        # when the run was recorded, a replayed run uses it as its current time
+        self.recorded_at = DateTime.now(timezone.utc)
+
+        if replay:
+            lines = _read_lines(path)
+            self.records = _by_request_key(lines)
+            metadata = lines[0] if lines else {}
+
+            if "recorded_at" in metadata:
+                self.recorded_at = DateTime.fromisoformat(metadata["recorded_at"])
+
+    def record(self, method: str, url: str, body, response: RecordedResponse):
+        # the first response of a request is kept, e.g. before the page is updated
+        self.records.setdefault(
+            request_key(method, url, body), to_record(method, url, body, response)
+        )
+
+    def play(self, method: str, url: str, body=None) -> RecordedResponse:
+        record = self.records.get(request_key(method, url, body))
+
+        if record is None:
+            self.misses += 1
+            raise CassetteMiss(f"{method.upper()} {url} is not recorded")
+
+        return from_record(record)
+
+    def save(self):
+        if not self.replaying:
+            save_records(
+                self.path,
+                self.records,
+                metadata={"recorded_at": self.recorded_at.isoformat()},
+            )
+
+
+_current_cassette: ContextVar[Optional[Cassette]] = ContextVar(
+    "current_cassette", default=None
+)
+
+
+@contextmanager
+def use_cassette(cassette: Optional[Cassette]):
+    """
+    Makes the fetch helpers of the tasks run in this context record to or replay from the cassette.
+    """
+    token = _current_cassette.set(cassette)
+
+    try:
+        yield cassette
+    finally:
+        _current_cassette.reset(token)
+
+
+def current_cassette() -> Optional[Cassette]:
+    return _current_cassette.get()
@@ -26,13 +26,19 @@ class DotDotNewsScraper(HTMLScraper):
             **kwargs,
         )
 
-    async def fetch_article(self, tag: "ResultSet[Tag]") -> "ResultSet[Tag]":
+    def get_article_url(self, tag: "ResultSet[Tag]") -> str:
         href_tag = tag.select_one("h2 > a[href]")
 
         if href_tag is None:
             return None
 
-        article_url = href_tag["href"]
+        return href_tag["href"]
+
+    async def fetch_article(self, tag: "ResultSet[Tag]") -> "ResultSet[Tag]":
+        article_url = self.get_article_url(tag)
+
+        if article_url is None:
+            return None
 
         content = await fetch_content(
             article_url,
@@ -1,5 +1,6 @@
 import re
 from scraper.utils import fetch_content
+from scraper.http_cache import NotModified
 from typing import TYPE_CHECKING, Optional
 from bs4 import BeautifulSoup
 from scraper.scraper import Scraper, ScraperOutput
@@ -11,6 +12,10 @@ if TYPE_CHECKING:
 class HTMLScraper(Scraper):
     """
     A scraper for HTML webpage.
+
+    If `item_body_selector` is set, the text of the matching elements is used as the
+    extracted article body, unless it is shorter than `min_body_length`, in which case the
+    body is extracted from the HTML content by diffing it like for the other scrapers.
     """
 
     def __init__(
@@ -22,6 +27,8 @@ class HTMLScraper(Scraper):
         item_content_selector: Optional[str] = None,
         item_url_selector: Optional[str] = None,
         item_author_selector: Optional[str] = None,
+        item_body_selector: Optional[str] = None,
+        min_body_length: int = 50,
         **kwargs,
     ):
         self.index_item_selector = index_item_selector
@@ -31,6 +38,8 @@ class HTMLScraper(Scraper):
         self.item_content_selector = item_content_selector
         self.item_date_selector = item_date_selector
         self.item_author_selector = item_author_selector
+        self.item_body_selector = item_body_selector
+        self.min_body_length = min_body_length
 
         super().__init__(**kwargs)
 
@@ -42,6 +51,7 @@ class HTMLScraper(Scraper):
             index_page_html = await fetch_content(
                 self.index_url,
                 headers={**self.headers, "Referer": self.index_url},
+                conditional=True,
             )
 
             if callable(self.index_item_selector):
@@ -56,10 +66,27 @@ class HTMLScraper(Scraper):
             items = index_soup.select(self.index_item_selector)
 
             return items
+        except NotModified:
+            raise
         except Exception as e:
             print("Error", e)
             return []
 
+    def get_article_url(self, tag: "ResultSet[Tag]") -> Optional[str]:
+        """
+        Returns the URL of the article page linked from an index item.
+
+        Args:
+            tag (ResultSet[Tag]): The index item.
+
+        Returns:
+            Optional[str]: The URL of the article, or None if the article is not fetched from its own page.
+        """
+        return None
+
+    def get_index_key(self, tag: "ResultSet[Tag]") -> Optional[str]:
+        return self.get_article_url(tag)
+
     def _get_elem_text(self, tag: "ResultSet[Tag]", selector: str) -> str:
         if callable(selector):
             # if the selector is a callable, call it with the tag
@@ -92,6 +119,25 @@ class HTMLScraper(Scraper):
 
         return elem_tag.text
 
+    def _get_body_text(self, tag: "ResultSet[Tag]") -> Optional[str]:
+        if self.item_body_selector is None:
+            return None
+
+        if callable(self.item_body_selector):
+            # if the selector is a callable, call it with the tag
+            body = self.item_body_selector(tag)
+        else:
+            body = "\n".join(
+                elem.get_text(separator="\n", strip=True)
+                for elem in tag.select(self.item_body_selector)
+            )
+
+        if body is None or len(body.strip()) < self.min_body_length:
+            # the selector missed, e.g. the layout of the site changed
+            return None
+
+        return body.strip()
+
     def parse_article(self, tag: "ResultSet[Tag]") -> ScraperOutput:
         """
         Parses an article from the given index item.
@@ -151,4 +197,7 @@ class HTMLScraper(Scraper):
             author=author,
             date=date,
             url=url,
+            extracted=(
+                self._get_body_text(tag) if self.content_type == "text/html" else None
+            ),
         )
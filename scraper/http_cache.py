@@ -0,0 +1,157 @@
+import hashlib
+import os
+import sqlite3
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime as DateTime, timedelta
+from typing import Dict, NamedTuple, Optional
+
+
+class NotModified(Exception):
+    """
+    Raised by a conditional fetch when the response has not changed since it was cached.
+    """
+
+    def __init__(self, url: str, body: bytes):
+        super().__init__(f"{url} is not modified")
+        self.url = url
+        self.body = body
+
+
+class CachedResponse(NamedTuple):
+    url: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+    body: bytes
+
+
+class HTTPCache:
+    """
+    A persistent cache of the validators (ETag and Last-Modified) and bodies of responses.
+
+    The entries are kept in a SQLite database so that the file can be restored between runs,
+    entries added or revalidated during a run are only written on `commit()`, and entries
+    not refreshed for `retention_days` are removed.
+    """
+
+    def __init__(self, path: str, retention_days: int = 7):
+        directory = os.path.dirname(path)
+
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self.retention_days = retention_days
+        self._conn = sqlite3.connect(path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS http_cache (key TEXT PRIMARY KEY, url TEXT NOT NULL, etag TEXT, last_modified TEXT, body BLOB NOT NULL, stored_at TEXT NOT NULL)"
+        )
+        self._pending: Dict[str, CachedResponse] = {}
+        # key -> url of the responses revalidated with a 304
+        self._touched: Dict[str, str] = {}
+
+    @staticmethod
+    def get_key(url: str, method: str = "GET", body=None) -> str:
+        key = f"{method.upper()} {url}"
+
+        if body is not None:
+            key += " " + hashlib.sha1(str(body).encode("utf-8")).hexdigest()
+
+        return key
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        row = self._conn.execute(
+            "SELECT url, etag, last_modified, body FROM http_cache WHERE key = ?",
+            (key,),
+        ).fetchone()
+
+        return CachedResponse(*row) if row is not None else None
+
+    def add(self, key: str, response: CachedResponse):
+        """
+        Caches a response, it is written on `commit()`.
+
+        Args:
+          key (str): The cache key of the request.
+          response (CachedResponse): The response with at least one validator.
+        """
+        self._pending[key] = response
+
+    def touch(self, key: str, url: str):
+        """
+        Marks a cached response as still valid, e.g. after a 304, its `stored_at` is refreshed
+        on `commit()`.
+        """
+        self._touched[key] = url
+
+    def discard(self, url: str):
+        """
+        Drops the responses of the URL added or revalidated since the last commit, and the
+        stored response of the URL, e.g. when its scraper failed and the response should be
+        fetched in full again on the next run.
+        """
+        self._pending = {
+            key: response
+            for key, response in self._pending.items()
+            if response.url != url
+        }
+        self._touched = {
+            key: touched_url
+            for key, touched_url in self._touched.items()
+            if touched_url != url
+        }
+
+        with self._conn:
+            self._conn.execute("DELETE FROM http_cache WHERE url = ?", (url,))
+
+    def commit(self, now: Optional[DateTime] = None):
+        """
+        Writes the responses added since the last commit and removes the expired responses.
+        """
+        now = now or DateTime.now()
+        stored_at = now.isoformat()
+
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO http_cache (key, url, etag, last_modified, body, stored_at) VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (key, *response, stored_at)
+                    for key, response in self._pending.items()
+                ],
+            )
+            self._conn.executemany(
+                "UPDATE http_cache SET stored_at = ? WHERE key = ?",
+                [(stored_at, key) for key in self._touched],
+            )
+            self._conn.execute(
+                "DELETE FROM http_cache WHERE stored_at < ?",
+                ((now - timedelta(days=self.retention_days)).isoformat(),),
+            )
+
+        self._pending = {}
+        self._touched = {}
+
+    def close(self):
+        self._conn.close()
+
+
+_current_cache: ContextVar[Optional[HTTPCache]] = ContextVar(
+    "current_http_cache", default=None
+)
+
+
+@contextmanager
+def use_http_cache(cache: Optional[HTTPCache]):
+    """
+    Makes the conditional fetches of the tasks run in this context use the cache.
+    """
+    token = _current_cache.set(cache)
+
+    try:
+        yield cache
+    finally:
+        _current_cache.reset(token)
+
+
+def current_http_cache() -> Optional[HTTPCache]:
+    return _current_cache.get()
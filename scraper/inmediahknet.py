@@ -1,7 +1,7 @@
 from datetime import datetime as DateTime
 from typing import TYPE_CHECKING
 from scraper.scraper import DEFAULT_HEADERS
-from scraper.utils import fetch_content
+from scraper.utils import fetch_short_url_content
 from scraper.telegram_scraper import TelegramScraper
 from bs4 import BeautifulSoup
 
@@ -26,7 +26,7 @@ class InMediaHKNetTelegramScraper(TelegramScraper):
             **kwargs,
         )
 
-    async def fetch_article(self, tag: "ResultSet[Tag]") -> "ResultSet[Tag]":
+    def get_article_url(self, tag: "ResultSet[Tag]") -> str:
         href_tag = tag.select_one(
             ".tgme_widget_message_text > a[href^='https://bit.ly']"
         )
@@ -34,8 +34,16 @@ class InMediaHKNetTelegramScraper(TelegramScraper):
         if href_tag is None:
             return None
 
-        article_url = href_tag["href"]
-        content = await fetch_content(
+        return href_tag["href"]
+
+    async def fetch_article(self, tag: "ResultSet[Tag]") -> "ResultSet[Tag]":
+        article_url = self.get_article_url(tag)
+
+        if article_url is None:
+            return None
+
+        # the links are shortened, their final URL is cached so the redirects are followed once
+        content = await fetch_short_url_content(
             article_url,
             headers={
                 **DEFAULT_HEADERS,
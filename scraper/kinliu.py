@@ -1,6 +1,7 @@
 from datetime import datetime as DateTime
 from typing import TYPE_CHECKING
 from scraper.utils import fetch_content, fetch_json
+from scraper.http_cache import NotModified
 from bs4 import BeautifulSoup
 from scraper.html_scraper import HTMLScraper
 
@@ -32,12 +33,15 @@ class KinLiuScraper(HTMLScraper):
             item = await fetch_json(
                 self.index_url,
                 headers={**self.headers, "Referer": self.index_url},
+                conditional=True,
             )
             index_soup = BeautifulSoup(item["html"], "html.parser")
 
             items = index_soup.select(self.index_item_selector)
 
             return items
+        except NotModified:
+            raise
         except Exception as e:
             print("Error", e)
             return []
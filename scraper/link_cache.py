@@ -0,0 +1,118 @@
+import os
+import sqlite3
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime as DateTime, timedelta
+from typing import Dict, Optional, Tuple
+
+
+class LinkCache:
+    """
+    A persistent cache of the final URLs of shortened links, e.g. bit.ly links.
+
+    The links are kept in a SQLite database so that the file can be restored between runs,
+    links resolved during a run are only written on `commit()`. Links resolved more than
+    `ttl_days` ago are resolved again, and only the `max_entries` most recently used links
+    are kept. The final URL of a link is the URL its fetch was redirected to.
+    """
+
+    def __init__(self, path: str, ttl_days: int = 30, max_entries: int = 10000):
+        directory = os.path.dirname(path)
+
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self.ttl_days = ttl_days
+        self.max_entries = max_entries
+        self._conn = sqlite3.connect(path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS resolved_links (url TEXT PRIMARY KEY, resolved_url TEXT NOT NULL, resolved_at TEXT NOT NULL, used_at TEXT NOT NULL)"
+        )
+        # url -> (resolved url, resolved at)
+        self._pending: Dict[str, Tuple[str, str]] = {}
+        self._used: Dict[str, str] = {}
+
+    def get(self, url: str, now: Optional[DateTime] = None) -> Optional[str]:
+        """
+        Returns the final URL of the link, or None if it is not cached or expired.
+        """
+        now = now or DateTime.now()
+
+        if url in self._pending:
+            resolved_url = self._pending[url][0]
+        else:
+            row = self._conn.execute(
+                "SELECT resolved_url FROM resolved_links WHERE url = ? AND resolved_at >= ?",
+                (url, (now - timedelta(days=self.ttl_days)).isoformat()),
+            ).fetchone()
+            resolved_url = row[0] if row is not None else None
+
+        if resolved_url is not None:
+            self._used[url] = now.isoformat()
+
+        return resolved_url
+
+    def add(self, url: str, resolved_url: str, now: Optional[DateTime] = None):
+        """
+        Caches the final URL of a link, it is written on `commit()`.
+        """
+        resolved_at = (now or DateTime.now()).isoformat()
+        self._pending[url] = (resolved_url, resolved_at)
+        self._used[url] = resolved_at
+
+    def commit(self, now: Optional[DateTime] = None):
+        """
+        Writes the links resolved or used since the last commit, and removes the expired
+        and least recently used links.
+        """
+        now = now or DateTime.now()
+
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO resolved_links (url, resolved_url, resolved_at, used_at) VALUES (?, ?, ?, ?)",
+                [
+                    (url, resolved_url, resolved_at, self._used.pop(url, resolved_at))
+                    for url, (resolved_url, resolved_at) in self._pending.items()
+                ],
+            )
+            self._conn.executemany(
+                "UPDATE resolved_links SET used_at = ? WHERE url = ?",
+                [(used_at, url) for url, used_at in self._used.items()],
+            )
+            self._conn.execute(
+                "DELETE FROM resolved_links WHERE resolved_at < ?",
+                ((now - timedelta(days=self.ttl_days)).isoformat(),),
+            )
+            self._conn.execute(
+                "DELETE FROM resolved_links WHERE url NOT IN (SELECT url FROM resolved_links ORDER BY used_at DESC LIMIT ?)",
+                (self.max_entries,),
+            )
+
+        self._pending = {}
+        self._used = {}
+
+    def close(self):
+        self._conn.close()
+
+
+_current_cache: ContextVar[Optional[LinkCache]] = ContextVar(
+    "current_link_cache", default=None
+)
+
+
+@contextmanager
+def use_link_cache(cache: Optional[LinkCache]):
+    """
+    Makes the links resolved by the tasks run in this context use the cache.
+    """
+    token = _current_cache.set(cache)
+
+    try:
+        yield cache
+    finally:
+        _current_cache.reset(token)
+
+
+def current_link_cache() -> Optional[LinkCache]:
+    return _current_cache.get()
@@ -21,11 +21,11 @@ class MingPaoScraper(HTMLScraper):
             item_date_selector=".date",  # 2025年6月20日星期五
             item_url_selector="meta[property='og:url'][content]",  # <meta property="og:url" content="???">
             item_author_selector="meta[name='article:author'][content]",
+            item_body_selector="#upper p",
             **kwargs,
         )
 
-    async def fetch_article(self, tag: "ResultSet[Tag]") -> "ResultSet[Tag]":
-        # get html content in .tgme_widget_message_text
+    def get_article_url(self, tag: "ResultSet[Tag]") -> str:
         href_tag = tag.select_one("figure a[href]")
 
         if href_tag is None:
@@ -38,6 +38,14 @@ class MingPaoScraper(HTMLScraper):
         elif article_url.startswith(".."):
             article_url = "https://news.mingpao.com/" + article_url[2:]
 
+        return article_url
+
+    async def fetch_article(self, tag: "ResultSet[Tag]") -> "ResultSet[Tag]":
+        article_url = self.get_article_url(tag)
+
+        if article_url is None:
+            return None
+
         content = await fetch_content(
             article_url,
             headers={**self.headers, "Referer": self.index_url},
@@ -1,5 +1,6 @@
 from datetime import datetime as DateTime
 from scraper.utils import fetch_content
+from scraper.http_cache import NotModified
 import json
 from scraper.api_scraper import APIScraper
 
@@ -32,11 +33,14 @@ class ONCCScraper(APIScraper):
             api_res_text = await fetch_content(
                 self.index_url,
                 headers={**self.headers, "Referer": self.index_url},
+                conditional=True,
             )
-            # parse json
-            api_res_json = json.loads(api_res_text.encode("utf-8").decode("utf-8-sig"))
+            # parse json, the BOM is already stripped by fetch_content
+            api_res_json = json.loads(api_res_text)
 
             return api_res_json
+        except NotModified:
+            raise
         except Exception as e:
             print("Error", e)
             return []
@@ -0,0 +1,295 @@
+import asyncio
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from datetime import datetime as DateTime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+import aiohttp
+from scraper.session import MAX_CONNECTIONS_PER_HOST
+
+# the responses telling the host is overloaded, the concurrency to it is halved
+BACKOFF_STATUSES = {429, 503}
+# the concurrency only grows while the latency is within this factor of the fastest response
+LATENCY_TOLERANCE = 2.0
+
+
+class HostSlotTimeout(Exception):
+    """
+    Raised when no request to a host can be started within the time given.
+    """
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Parses a Retry-After header, either in seconds or as an HTTP date.
+
+    Returns:
+      Optional[float]: The seconds to wait, or None if the header is missing or invalid.
+    """
+    if not value:
+        return None
+
+    value = value.strip()
+
+    if value.isdigit():
+        return float(value)
+
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+
+    return max(0.0, (retry_at - DateTime.now(timezone.utc)).total_seconds())
+
+
+class HostLimiter:
+    """
+    Limits the requests to a single host with a token bucket and an adaptive concurrency limit.
+
+    The concurrency grows additively while the responses are fast and successful, and is
+    halved on 429/503 responses, timeouts and connection errors (AIMD). No request is
+    started before the time given by a Retry-After header.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: int,
+        initial_concurrency: int,
+        min_concurrency: int,
+        max_concurrency: int,
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.concurrency = float(initial_concurrency)
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        self.min_latency: Optional[float] = None
+        self._tokens = float(burst)
+        self._refilled_at = asyncio.get_running_loop().time()
+        self._decreased_at = 0.0
+        self._cond = asyncio.Condition()
+
+    def _refill(self, now: float):
+        self._tokens = min(
+            self.burst, self._tokens + (now - self._refilled_at) * self.rate
+        )
+        self._refilled_at = now
+
+    async def acquire(self, timeout: Optional[float] = None):
+        """
+        Waits until a request to the host can be started.
+
+        Args:
+          timeout (Optional[float]): The seconds to wait at most, None to wait as long as needed.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout if timeout is not None else None
+
+        async with self._cond:
+            while True:
+                now = loop.time()
+                self._refill(now)
+
+                if now < self.blocked_until:
+                    wait = self.blocked_until - now
+                elif self.in_flight >= int(self.concurrency):
+                    # wait for a request to be released
+                    wait = None
+                elif self._tokens < 1:
+                    wait = (1 - self._tokens) / self.rate
+                else:
+                    self._tokens -= 1
+                    self.in_flight += 1
+                    return
+
+                if deadline is not None:
+                    if now >= deadline:
+                        raise HostSlotTimeout(
+                            f"No request could be started within {timeout} seconds"
+                        )
+
+                    wait = deadline - now if wait is None else min(wait, deadline - now)
+
+                try:
+                    await asyncio.wait_for(self._cond.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def release(
+        self,
+        latency: float,
+        status: Optional[int] = None,
+        error: bool = False,
+        retry_after: Optional[float] = None,
+    ):
+        """
+        Releases a request and adapts the concurrency to its outcome.
+
+        Args:
+          latency (float): The seconds the request took.
+          status (Optional[int]): The status of the response, None if there is no response.
+          error (bool): Whether the request timed out or failed to connect.
+          retry_after (Optional[float]): The seconds to wait before the next request, from the Retry-After header.
+        """
+        now = asyncio.get_running_loop().time()
+
+        async with self._cond:
+            self.in_flight -= 1
+
+            if error or status in BACKOFF_STATUSES:
+                # decrease once per round trip, the requests in flight fail together
+                if now - self._decreased_at > latency:
+                    self.concurrency = max(self.min_concurrency, self.concurrency / 2)
+                    self._decreased_at = now
+            elif status is not None and status < 400:
+                if self.min_latency is None or latency < self.min_latency:
+                    self.min_latency = latency
+
+                if latency <= LATENCY_TOLERANCE * self.min_latency:
+                    self.concurrency = min(
+                        self.max_concurrency, self.concurrency + 1 / self.concurrency
+                    )
+
+            if retry_after is not None:
+                self.blocked_until = max(self.blocked_until, now + retry_after)
+
+            self._cond.notify_all()
+
+
+class RequestSlot:
+    """
+    The outcome of a request, reported by the fetch helpers to the limiter of its host.
+    """
+
+    def __init__(self):
+        self.status: Optional[int] = None
+        self.retry_after: Optional[float] = None
+
+    def record_response(self, response):
+        self.status = response.status
+
+        if response.status in BACKOFF_STATUSES:
+            self.retry_after = parse_retry_after(response.headers.get("Retry-After"))
+
+
+class RateLimiter:
+    """
+    The per host limiters shared by every scraper in a run.
+
+    Args:
+      rate (float): The requests per second started to a host.
+      burst (int): The requests which can be started at once after the host was idle.
+      initial_concurrency (int): The requests in flight to a host at the start.
+      min_concurrency (int): The lowest the concurrency to a host is decreased to.
+      max_concurrency (int): The highest the concurrency to a host is increased to.
+    """
+
+    def __init__(
+        self,
+        rate: float = 10.0,
+        burst: int = 10,
+        initial_concurrency: int = 3,
+        min_concurrency: int = 1,
+        max_concurrency: int = MAX_CONNECTIONS_PER_HOST,
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.initial_concurrency = initial_concurrency
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self._hosts: Dict[str, HostLimiter] = {}
+
+    def get_host_limiter(self, url: str) -> HostLimiter:
+        host = urlsplit(str(url)).netloc.lower()
+
+        if host not in self._hosts:
+            self._hosts[host] = HostLimiter(
+                rate=self.rate,
+                burst=self.burst,
+                initial_concurrency=self.initial_concurrency,
+                min_concurrency=self.min_concurrency,
+                max_concurrency=self.max_concurrency,
+            )
+
+        return self._hosts[host]
+
+    @asynccontextmanager
+    async def limit(self, url: str, timeout: Optional[float] = None):
+        """
+        Waits until a request to the host of the URL can be started.
+
+        Args:
+          url (str): The URL requested.
+          timeout (Optional[float]): The seconds to wait at most, HostSlotTimeout is raised past them.
+
+        Yields:
+          RequestSlot: The slot the response is recorded on.
+        """
+        host_limiter = self.get_host_limiter(url)
+        slot = RequestSlot()
+        await host_limiter.acquire(timeout)
+        start = asyncio.get_running_loop().time()
+        error = False
+
+        try:
+            yield slot
+        except (asyncio.TimeoutError, aiohttp.ClientConnectionError):
+            error = True
+            raise
+        finally:
+            await host_limiter.release(
+                asyncio.get_running_loop().time() - start,
+                status=slot.status,
+                error=error,
+                retry_after=slot.retry_after,
+            )
+
+
+_current_limiter: ContextVar[Optional[RateLimiter]] = ContextVar(
+    "current_rate_limiter", default=None
+)
+
+
+@contextmanager
+def use_rate_limiter(limiter: Optional[RateLimiter]):
+    """
+    Makes the fetch helpers of the tasks run in this context use the rate limiter.
+    """
+    token = _current_limiter.set(limiter)
+
+    try:
+        yield limiter
+    finally:
+        _current_limiter.reset(token)
+
+
+def current_rate_limiter() -> Optional[RateLimiter]:
+    return _current_limiter.get()
+
+
+@asynccontextmanager
+async def limit_host(url: str, timeout: Optional[float] = None):
+    """
+    Limits a request with the active rate limiter, if any.
+
+    Args:
+      url (str): The URL requested.
+      timeout (Optional[float]): The seconds to wait for a slot at most, HostSlotTimeout is raised past them.
+
+    Yields:
+      RequestSlot: The slot the response is recorded on.
+    """
+    limiter = current_rate_limiter()
+
+    if limiter is None:
+        yield RequestSlot()
+    else:
+        async with limiter.limit(url, timeout) as slot:
+            yield slot
@@ -31,7 +31,7 @@ class RFACantoneseScraper(TelegramScraper):
 
         return date
 
-    async def fetch_article(self, tag: "ResultSet[Tag]") -> "ResultSet[Tag]":
+    def get_article_url(self, tag: "ResultSet[Tag]") -> str:
         href_tag = tag.select_one(
             ".tgme_widget_message_text > a[href^='https://ca.rfa.org']"
         )
@@ -39,7 +39,14 @@ class RFACantoneseScraper(TelegramScraper):
         if href_tag is None:
             return None
 
-        article_url = href_tag["href"]
+        return href_tag["href"]
+
+    async def fetch_article(self, tag: "ResultSet[Tag]") -> "ResultSet[Tag]":
+        article_url = self.get_article_url(tag)
+
+        if article_url is None:
+            return None
+
         content = await fetch_content(article_url)
         content_soup = BeautifulSoup(content, "html.parser")
 
@@ -1,5 +1,8 @@
+import asyncio
 from scraper.utils import fetch_content
-from typing import Dict, Any
+from scraper.http_cache import NotModified
+from datetime import datetime as DateTime
+from typing import Dict, Any, Optional
 import feedparser
 from scraper.scraper import Scraper, ScraperOutput, DEFAULT_USER_AGENT
 
@@ -26,18 +29,40 @@ class RSSScraper(Scraper):
     async def parse_index(self):
         """
         Asynchronously parses the index page and extracts a list of URLs.
+
+        The feed is fetched with the async fetch helpers and parsed in a worker thread, so the
+        other scrapers keep running while feedparser is busy.
         """
         try:
             user_agent = self.headers.get("User-Agent", DEFAULT_USER_AGENT)
-
-            d = feedparser.parse(
-                self.index_url, agent=user_agent, referrer=self.index_url
+            feed = await fetch_content(
+                self.index_url,
+                headers={
+                    **self.headers,
+                    "User-Agent": user_agent,
+                    "Referer": self.index_url,
+                },
+                conditional=True,
+                as_bytes=True,
             )
+
+            # feedparser detects the encoding from the XML declaration
+            d = await asyncio.to_thread(feedparser.parse, feed)
             return d.entries
+        except NotModified:
+            raise
         except Exception as e:
             print("Error", e)
             return []
 
+    def get_index_key(self, item: Dict[str, Any]) -> Optional[str]:
+        return item.get(self.item_id_selector) or item.get(self.item_url_selector)
+
+    def get_index_date(self, item: Dict[str, Any]) -> Optional[DateTime]:
+        date_value = item.get(self.item_date_selector)
+
+        return self._parse_date(date_value) if date_value else None
+
     async def fetch_article(self, item: Dict[str, Any]):
         """
         Fetches the full article content from the given URL.
@@ -100,8 +125,6 @@ class RSSScraper(Scraper):
 
 
 if __name__ == "__main__":
-    import asyncio
-
     scraper = RSSScraper(
         index_url="https://rthk9.rthk.hk/rthk/news/rss/e_expressnews_elocal.xml",
         category="news",
@@ -1,6 +1,6 @@
 from datetime import datetime as DateTime
 from scraper.telegram_scraper import TelegramScraper
-from scraper.utils import fetch_content
+from scraper.utils import fetch_short_url_content
 from bs4 import BeautifulSoup
 
 
@@ -22,14 +22,22 @@ class SCMPScraper(TelegramScraper):
             **kwargs,
         )
 
-    async def fetch_article(self, tag: "ResultSet[Tag]") -> "ResultSet[Tag]":
+    def get_article_url(self, tag: "ResultSet[Tag]") -> str:
         href_tag = tag.select_one(".tgme_widget_message_text > a")
 
         if href_tag is None:
             return None
 
-        article_url = href_tag["href"]
-        content = await fetch_content(
+        return href_tag["href"]
+
+    async def fetch_article(self, tag: "ResultSet[Tag]") -> "ResultSet[Tag]":
+        article_url = self.get_article_url(tag)
+
+        if article_url is None:
+            return None
+
+        # the links are shortened, their final URL is cached so the redirects are followed once
+        content = await fetch_short_url_content(
             article_url,
             headers={**self.headers, "Referer": self.index_url},
         )
@@ -1,11 +1,31 @@
-from datetime import datetime as DateTime
+from datetime import datetime as DateTime, date as Date
 import asyncio
+import logging
+import time
 from zoneinfo import ZoneInfo
 import dateparser
 from pydantic.dataclasses import dataclass
 from abc import ABC, abstractmethod
-from typing import List, Any, Optional, Literal, Coroutine, Sequence
+from typing import (
+    List,
+    Any,
+    Optional,
+    Literal,
+    Coroutine,
+    Sequence,
+    AsyncIterator,
+    Tuple,
+    TYPE_CHECKING,
+)
 from scraper.utils import text_processing
+from scraper.stats import record_index, record_parse
+from scraper.http_cache import NotModified
+from scraper.rate_limit import current_rate_limiter
+
+if TYPE_CHECKING:
+    from scraper.seen_store import SeenStore
+
+logger = logging.getLogger(__name__)
 
 DEFAULT_USER_AGENT = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/137.0.0.0 Safari/537.36"
 DEFAULT_HEADERS = {
@@ -46,6 +66,12 @@ class ScraperOutput:
     author: Optional[str]
     date: Optional[DateTime]
     url: Optional[str]
+    # the text of the article body if the scraper extracts it, the HTML content is extracted otherwise
+    extracted: Optional[str] = None
+    # an article sent in an earlier run, only fetched as the reference of the HTML extraction
+    reference_only: bool = False
+    # the key of the article in the seen store, set by Scraper.iter_articles
+    seen_key: Optional[str] = None
 
     def __repr__(self):
         return f"{self.title} by {self.author} on {self.date}"
@@ -78,6 +104,7 @@ class Scraper(ABC):
         num_proc=1,
         max_items: Optional[int] = None,
         headers=DEFAULT_HEADERS,
+        seen_store: Optional["SeenStore"] = None,
     ):
         self.index_url = index_url
         self.category = category
@@ -85,6 +112,13 @@ class Scraper(ABC):
         self.max_items = max_items
         self.content_type = content_type
         self.headers = headers
+        self.seen_store = seen_store
+        self.num_skipped = 0  # number of index items skipped in the last run
+        self.num_failed = 0  # number of articles failed in the last run
+        self.index_not_modified = (
+            False  # whether the index was unchanged in the last run
+        )
+        self._sent_keys: List[str] = []
 
     def __repr__(self):
         return self.index_url
@@ -118,40 +152,274 @@ class Scraper(ABC):
         """
         raise NotImplementedError
 
-    async def get_articles(self) -> List[ScraperOutput]:
+    async def get_articles(
+        self, published_on: Optional[Date] = None
+    ) -> List[ScraperOutput]:
         """
         Asynchronously retrieves articles by parsing indexes and fetching each article.
 
+        Args:
+          published_on (Optional[date]): If set, index items with a publish date on another day are not fetched.
+
         Returns:
           List[ScraperOutput]: A list of ScraperOutput objects representing the articles.
         """
-        article_indexes = await self.parse_index()
+        return [
+            article async for article in self.iter_articles(published_on=published_on)
+        ]
+
+    async def iter_articles(
+        self,
+        published_on: Optional[Date] = None,
+        queue_size: Optional[int] = None,
+        keep_reference: bool = True,
+    ) -> AsyncIterator[ScraperOutput]:
+        """
+        Asynchronously yields the articles as soon as they are fetched and parsed.
+
+        The articles are fetched by `num_proc` workers, or as many as the rate limiter allows
+        per host if one is active, which wait once `queue_size` parsed articles (`num_proc` by
+        default) are not consumed yet. The articles are yielded in
+        the order they are completed. Nothing is yielded if the index is fetched
+        conditionally and has not changed since the last run.
+
+        Args:
+          published_on (Optional[date]): If set, index items with a publish date on another day are not fetched.
+          queue_size (Optional[int]): The maximum number of parsed articles waiting to be consumed.
+          keep_reference (bool): If True and there is only one new HTML article, an already seen or stale article is also yielded as the reference of its extraction, with `reference_only` set.
+
+        Yields:
+          ScraperOutput: The parsed articles.
+        """
+        start = time.perf_counter()
+        self.index_not_modified = False
+
+        try:
+            article_indexes = await self.parse_index()
+        except NotModified:
+            # the index has not changed since the last run, so there are no new articles
+            logger.info(f"Index not modified: {self.index_url}")
+            self.index_not_modified = True
+            self.num_skipped = 0
+            self.num_failed = 0
+            record_index(time.perf_counter() - start, 0, 0, not_modified=True)
+            return
+
         article_indexes = (
             article_indexes[: self.max_items]
             if self.max_items is not None
             else article_indexes
         )
-
-        # fetch the articles
-        article_items = await asyncio.gather(
-            *_limit_concurrency(
-                [self.fetch_article(index) for index in article_indexes],
-                concurrency=self.num_proc,
-            )
+        num_indexes = len(article_indexes)
+        self.num_failed = 0
+        article_indexes, stale_indexes = self._filter_stale(
+            article_indexes, published_on
+        )
+        article_indexes, seen_indexes = self._filter_seen(article_indexes)
+        reference_indexes = (
+            self._get_reference_indexes(article_indexes, seen_indexes + stale_indexes)
+            if keep_reference
+            else []
         )
+        self.num_skipped = (
+            len(stale_indexes) + len(seen_indexes) - len(reference_indexes)
+        )
+        record_index(time.perf_counter() - start, num_indexes, self.num_skipped)
+        # the keys need to be taken before fetching, fetch_article may modify the items
+        pending_indexes = iter(
+            [(self._get_seen_key(index), index, False) for index in article_indexes]
+            + [(self._get_seen_key(index), index, True) for index in reference_indexes]
+        )
+        queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size or self.num_proc)
+        self._sent_keys = []
+
+        async def worker():
+            for key, index, reference_only in pending_indexes:
+                try:
+                    item = await self.fetch_article(index)
+                except Exception as e:
+                    logger.warning(f"Error fetching article: {e}")
+                    self.num_failed += 1
+                    continue
 
-        # postprocess the article items
-        articles = []
+                if item is None:
+                    continue
+
+                start = time.perf_counter()
 
-        for item in article_items:
-            if item is not None:
                 try:
                     article = self.parse_article(item)
-                    articles.append(article)
                 except Exception as e:
-                    print(f"Error parsing article: {e}")
+                    logger.warning(f"Error parsing article: {e}")
+                    self.num_failed += 1
+                    continue
+                finally:
+                    record_parse(time.perf_counter() - start)
+
+                if article is not None:
+                    article.reference_only = reference_only
+                    article.seen_key = key
+
+                if article is not None:
+                    await queue.put(article)
+
+        workers = asyncio.ensure_future(
+            asyncio.gather(
+                *[
+                    worker()
+                    for _ in range(
+                        min(
+                            self._get_num_workers(),
+                            len(article_indexes) + len(reference_indexes),
+                        )
+                    )
+                ]
+            )
+        )
+
+        getter = None
+
+        try:
+            while not (workers.done() and queue.empty()):
+                getter = asyncio.ensure_future(queue.get())
+                await asyncio.wait(
+                    [getter, workers], return_when=asyncio.FIRST_COMPLETED
+                )
+
+                if getter.done():
+                    yield getter.result()
+                else:
+                    # all workers are done and the queue is empty
+                    getter.cancel()
+
+            workers.result()
+        finally:
+            # the consumer stopped early, stop fetching the remaining articles
+            if getter is not None:
+                getter.cancel()
+
+            if not workers.done():
+                workers.cancel()
+                await asyncio.gather(workers, return_exceptions=True)
+
+    def _get_num_workers(self) -> int:
+        # the rate limiter adapts the requests in flight to each host, so the workers only cap it
+        rate_limiter = current_rate_limiter()
+
+        return (
+            max(self.num_proc, rate_limiter.max_concurrency)
+            if rate_limiter is not None
+            else self.num_proc
+        )
+
+    def get_index_key(self, item: Any) -> Optional[str]:
+        """
+        Returns a key identifying the article of an index item before it is fetched, e.g. the article id or URL.
+
+        Args:
+          item (Any): The index item.
+
+        Returns:
+          Optional[str]: The key of the article, or None if it is unknown and the item should always be fetched.
+        """
+        return None
+
+    def get_index_date(self, item: Any) -> Optional[DateTime]:
+        """
+        Returns the publish date of an index item if the index carries it.
+
+        Args:
+          item (Any): The index item.
+
+        Returns:
+          Optional[datetime]: The publish date, or None if it is unknown and the item should always be fetched.
+        """
+        return None
+
+    def _filter_stale(
+        self, items: List[Any], published_on: Optional[Date]
+    ) -> Tuple[List[Any], List[Any]]:
+        """
+        Splits the index items published on `published_on` from the ones published on another day.
+        """
+        if published_on is None:
+            return items, []
+
+        fresh_items = []
+        stale_items = []
+
+        for item in items:
+            try:
+                date = self.get_index_date(item)
+            except Exception:
+                date = None
+
+            if date is None or date.date() == published_on:
+                fresh_items.append(item)
+            else:
+                stale_items.append(item)
+
+        return fresh_items, stale_items
+
+    def _get_seen_key(self, item: Any) -> Optional[str]:
+        try:
+            key = self.get_index_key(item)
+        except Exception:
+            return None
+
+        return f"{type(self).__name__}:{key}" if key else None
+
+    def _filter_seen(self, items: List[Any]) -> Tuple[List[Any], List[Any]]:
+        """
+        Splits the index items of the new articles from the ones already in the seen store.
+        """
+        if self.seen_store is None:
+            return items, []
+
+        unseen_items = []
+        seen_items = []
+
+        for item in items:
+            key = self._get_seen_key(item)
+
+            if key is not None and key in self.seen_store:
+                seen_items.append(item)
+            else:
+                unseen_items.append(item)
+
+        return unseen_items, seen_items
+
+    def _get_reference_indexes(
+        self, items: List[Any], skipped_items: List[Any]
+    ) -> List[Any]:
+        """
+        Returns the skipped index item kept as the reference of the HTML extraction, if any.
+
+        The HTML extraction diffs an article against another one of the same source, so a
+        skipped article (seen, or else stale) is kept if there is only one new article.
+        """
+        if self.content_type == "text/html" and len(items) == 1 and skipped_items:
+            return skipped_items[:1]
+
+        return []
+
+    def mark_sent(self, article: ScraperOutput):
+        """
+        Records an article of the last run as sent, it is added to the seen store by `mark_seen()`.
+        """
+        if article.seen_key is not None and not article.reference_only:
+            self._sent_keys.append(article.seen_key)
+
+    def mark_seen(self):
+        """
+        Adds the articles sent in the last run to the seen store, call it once they are delivered.
+
+        The other articles, e.g. failed or extracted without text, are fetched again in the next run.
+        """
+        if self.seen_store is not None:
+            self.seen_store.add(self._sent_keys)
 
-        return articles
+        self._sent_keys = []
 
     async def fetch_article(self, item: Any) -> Any:
         """
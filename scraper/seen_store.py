@@ -0,0 +1,67 @@
+import os
+import sqlite3
+from datetime import datetime as DateTime, timedelta
+from typing import Iterable, List, Optional
+
+
+class SeenStore:
+    """
+    A persistent set of the articles that have already been sent to the pipeline.
+
+    The keys are kept in a SQLite database so that the file can be restored between runs,
+    keys added during a run are only written on `commit()`, and keys older than
+    `retention_days` are removed.
+    """
+
+    def __init__(self, path: str, retention_days: int = 7):
+        directory = os.path.dirname(path)
+
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self.retention_days = retention_days
+        self._conn = sqlite3.connect(path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS seen_articles (key TEXT PRIMARY KEY, seen_at TEXT NOT NULL)"
+        )
+        self._pending: List[str] = []
+
+    def __contains__(self, key: str) -> bool:
+        return (
+            self._conn.execute(
+                "SELECT 1 FROM seen_articles WHERE key = ?", (key,)
+            ).fetchone()
+            is not None
+        )
+
+    def add(self, keys: Iterable[str]):
+        """
+        Marks the given keys as seen, they are written on `commit()`.
+
+        Args:
+          keys (Iterable[str]): The article keys.
+        """
+        self._pending.extend(keys)
+
+    def commit(self, now: Optional[DateTime] = None):
+        """
+        Writes the keys added since the last commit and removes the expired keys.
+        """
+        now = now or DateTime.now()
+        seen_at = now.isoformat()
+
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO seen_articles (key, seen_at) VALUES (?, ?)",
+                [(key, seen_at) for key in self._pending],
+            )
+            self._conn.execute(
+                "DELETE FROM seen_articles WHERE seen_at < ?",
+                ((now - timedelta(days=self.retention_days)).isoformat(),),
+            )
+
+        self._pending = []
+
+    def close(self):
+        self._conn.close()
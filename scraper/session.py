@@ -0,0 +1,69 @@
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Optional, TYPE_CHECKING
+import aiohttp
+
+if TYPE_CHECKING:
+    from aiosocks import Socks5Addr
+
+# the connection pool shared by every scraper in a run
+MAX_CONNECTIONS = 100
+MAX_CONNECTIONS_PER_HOST = 8
+KEEPALIVE_TIMEOUT = 30
+DNS_CACHE_TTL = 300
+
+_current_session: ContextVar[Optional[aiohttp.ClientSession]] = ContextVar(
+    "current_session", default=None
+)
+
+
+@asynccontextmanager
+async def shared_session(
+    limit: int = MAX_CONNECTIONS,
+    limit_per_host: int = MAX_CONNECTIONS_PER_HOST,
+    keepalive_timeout: float = KEEPALIVE_TIMEOUT,
+    ttl_dns_cache: int = DNS_CACHE_TTL,
+):
+    """
+    Opens a session with a pooled connector used by the fetch helpers of the tasks run in this context.
+
+    The connections are kept alive between requests and the DNS lookups are cached,
+    so the articles of the same host reuse the connections of the index page.
+
+    Args:
+      limit (int): The maximum number of open connections.
+      limit_per_host (int): The maximum number of open connections to a host.
+      keepalive_timeout (float): The seconds an idle connection is kept open.
+      ttl_dns_cache (int): The seconds a DNS lookup is cached.
+    """
+    connector = aiohttp.TCPConnector(
+        limit=limit,
+        limit_per_host=limit_per_host,
+        keepalive_timeout=keepalive_timeout,
+        ttl_dns_cache=ttl_dns_cache,
+    )
+
+    async with aiohttp.ClientSession(connector=connector) as session:
+        token = _current_session.set(session)
+
+        try:
+            yield session
+        finally:
+            _current_session.reset(token)
+
+
+@asynccontextmanager
+async def get_session(conn: Optional["Socks5Addr"] = None):
+    """
+    Yields the shared session of the run, or a session for a single request if there is none.
+
+    Args:
+      conn (Optional[Socks5Addr]): The connector to use instead of the shared one.
+    """
+    session = _current_session.get()
+
+    if conn is None and session is not None and not session.closed:
+        yield session
+    else:
+        async with aiohttp.ClientSession(connector=conn) as session:
+            yield session
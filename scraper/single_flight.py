@@ -0,0 +1,139 @@
+import asyncio
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import Context, ContextVar, copy_context
+from typing import Awaitable, Callable, Dict, Optional
+from yarl import URL
+from scraper.cassette import RecordedResponse
+
+# the request headers which do not change the response, e.g. the same article linked from two pages
+IGNORED_HEADERS = {"referer"}
+
+
+def get_request_key(url: str, method: str = "GET", headers=None, body=None) -> str:
+    """
+    Returns the key of a request, with the URL normalized and the ignored headers left out.
+    """
+    normalized_url = URL(str(url)).with_fragment(None)
+    normalized_url = normalized_url.with_query(sorted(normalized_url.query.items()))
+    normalized_headers = sorted(
+        (name.lower(), value)
+        for name, value in (headers or {}).items()
+        if name.lower() not in IGNORED_HEADERS
+    )
+
+    return f"{method.upper()} {normalized_url} {normalized_headers} {body if body is not None else ''}"
+
+
+class RequestCoalescer:
+    """
+    Shares the responses of identical requests within a run.
+
+    A request sent while an identical one is in flight waits for its response instead of
+    being sent again, and the responses are kept for later requests until they take more
+    than `max_bytes`, the least recently used ones are dropped first. Failed requests are
+    not kept. The shared request runs in its own context, so each caller applies its own
+    timeout while waiting for it, and it is cancelled once no caller waits for it anymore.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024**2):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self._responses: "OrderedDict[str, RecordedResponse]" = OrderedDict()
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self._waiters: Dict[asyncio.Future, int] = {}
+
+    async def fetch(
+        self,
+        key: str,
+        send: Callable[[], Awaitable[RecordedResponse]],
+        timeout: Optional[float] = None,
+        context: Optional[Context] = None,
+    ) -> RecordedResponse:
+        """
+        Returns the response of the request, sending it with `send` only if it is neither
+        kept nor in flight.
+
+        Args:
+          key (str): The key of the request, see `get_request_key`.
+          send (Callable[[], Awaitable[RecordedResponse]]): Sends the request.
+          timeout (Optional[float]): The time to wait for the response in seconds, the request is only cancelled past it if no other caller waits for it.
+          context (Optional[Context]): The context the request is sent in, a copy of the current one if None.
+
+        Returns:
+          RecordedResponse: The response.
+
+        Raises:
+          asyncio.TimeoutError: If the response is not received within `timeout`.
+        """
+        if key in self._responses:
+            self._responses.move_to_end(key)
+            self.hits += 1
+
+            return self._responses[key]
+
+        future = self._in_flight.get(key)
+
+        if future is None:
+            # the task is created in the given context instead of the one of the first caller
+            future = (context or copy_context()).run(asyncio.ensure_future, send())
+            self._in_flight[key] = future
+            future.add_done_callback(lambda future: self._done(key, future))
+        else:
+            self.hits += 1
+
+        self._waiters[future] = self._waiters.get(future, 0) + 1
+
+        try:
+            # a cancelled request does not cancel the others waiting for the same response
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        finally:
+            self._waiters[future] -= 1
+
+            if self._waiters[future] == 0:
+                del self._waiters[future]
+
+                # every caller timed out or was cancelled, stop retrying in the background
+                if not future.done():
+                    future.cancel()
+
+    def _done(self, key: str, future: asyncio.Future):
+        self._in_flight.pop(key, None)
+
+        if future.cancelled() or future.exception() is not None:
+            return
+
+        response = future.result()
+
+        if len(response.content) > self.max_bytes:
+            return
+
+        self._responses[key] = response
+        self.size += len(response.content)
+
+        while self.size > self.max_bytes:
+            _, evicted = self._responses.popitem(last=False)
+            self.size -= len(evicted.content)
+
+
+_current_coalescer: ContextVar[Optional[RequestCoalescer]] = ContextVar(
+    "current_coalescer", default=None
+)
+
+
+@contextmanager
+def use_coalescer(coalescer: Optional[RequestCoalescer]):
+    """
+    Makes the identical requests of the tasks run in this context share their responses.
+    """
+    token = _current_coalescer.set(coalescer)
+
+    try:
+        yield coalescer
+    finally:
+        _current_coalescer.reset(token)
+
+
+def current_coalescer() -> Optional[RequestCoalescer]:
+    return _current_coalescer.get()
@@ -0,0 +1,199 @@
+import json
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+
+def _percentile(values: List[float], percentile: float) -> Optional[float]:
+    if not values:
+        return None
+
+    values = sorted(values)
+    index = min(len(values) - 1, round(percentile / 100 * (len(values) - 1)))
+
+    return values[index]
+
+
+class SourceStats:
+    """
+    Performance counters of a single scraper in a run.
+    """
+
+    def __init__(self):
+        self.index_items = 0
+        self.skipped_items = 0
+        self.index_not_modified = False
+        self.parsed = 0
+        self.events = 0
+        self.event_bytes = 0
+        self.fetches = 0
+        self.fetch_errors = 0
+        self.fetch_latencies: List[float] = []
+        self.bytes_downloaded = 0
+        self.index_time = 0.0
+        self.parse_time = 0.0
+        self.page_parses = 0
+        self.page_parse_time = 0.0
+        self.extractions = 0
+        self.extract_time = 0.0
+        self.failed = False
+        self.started_at = time.perf_counter()
+        self.duration = 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "index_items": self.index_items,
+            "skipped_items": self.skipped_items,
+            "index_not_modified": self.index_not_modified,
+            "parsed": self.parsed,
+            "events": self.events,
+            "event_bytes": self.event_bytes,
+            "fetches": self.fetches,
+            "fetch_errors": self.fetch_errors,
+            "fetch_latency_p50": _percentile(self.fetch_latencies, 50),
+            "fetch_latency_p95": _percentile(self.fetch_latencies, 95),
+            "bytes_downloaded": self.bytes_downloaded,
+            "index_time": self.index_time,
+            "parse_time": self.parse_time,
+            "page_parses": self.page_parses,
+            "page_parse_time": self.page_parse_time,
+            "extractions": self.extractions,
+            "extract_time": self.extract_time,
+            "failed": self.failed,
+            "duration": self.duration,
+        }
+
+
+class RunStats:
+    """
+    Collects the performance counters of a run, per scraper and for the pipeline requests.
+
+    The counters are recorded through the module level `record_*` functions, which add
+    them to the scraper tracked in the current context with `track()`.
+    """
+
+    def __init__(self):
+        self.sources: Dict[str, SourceStats] = {}
+        self.send_requests = 0
+        self.send_errors = 0
+        self.send_bytes = 0
+        self.send_latencies: List[float] = []
+        self.started_at = time.perf_counter()
+
+    @contextmanager
+    def track(self, source: str):
+        """
+        Records the counters of the code run in this context, and the tasks it creates, for the given scraper.
+
+        Args:
+          source (str): The name of the scraper.
+        """
+        stats = self.sources.setdefault(source, SourceStats())
+        token = _current_source.set(stats)
+        stats.started_at = time.perf_counter()
+
+        try:
+            yield stats
+        finally:
+            stats.duration = time.perf_counter() - stats.started_at
+            _current_source.reset(token)
+
+    def record_send(self, latency: float, size: int, error: bool = False):
+        self.send_requests += 1
+        self.send_bytes += size
+        self.send_latencies.append(latency)
+
+        if error:
+            self.send_errors += 1
+
+    def to_dict(self) -> dict:
+        return {
+            "duration": time.perf_counter() - self.started_at,
+            "sources": {
+                source: stats.to_dict() for source, stats in self.sources.items()
+            },
+            "pipeline": {
+                "requests": self.send_requests,
+                "errors": self.send_errors,
+                "bytes": self.send_bytes,
+                "send_time": sum(self.send_latencies),
+                "latency_p50": _percentile(self.send_latencies, 50),
+                "latency_p95": _percentile(self.send_latencies, 95),
+            },
+        }
+
+    def write(self, path: str):
+        """
+        Writes the report as JSON.
+        """
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+
+_current_source: ContextVar[Optional[SourceStats]] = ContextVar(
+    "current_source", default=None
+)
+
+
+def current_stats() -> Optional[SourceStats]:
+    """
+    Returns the counters of the scraper tracked in the current context, if any.
+    """
+    return _current_source.get()
+
+
+def record_fetch(latency: float, size: int, error: bool = False):
+    stats = current_stats()
+
+    if stats is not None:
+        stats.fetches += 1
+        stats.fetch_latencies.append(latency)
+        stats.bytes_downloaded += size
+
+        if error:
+            stats.fetch_errors += 1
+
+
+def record_index(
+    index_time: float, index_items: int, skipped_items: int, not_modified=False
+):
+    stats = current_stats()
+
+    if stats is not None:
+        stats.index_time += index_time
+        stats.index_items += index_items
+        stats.skipped_items += skipped_items
+        stats.index_not_modified = stats.index_not_modified or not_modified
+
+
+def record_parse(parse_time: float):
+    stats = current_stats()
+
+    if stats is not None:
+        stats.parsed += 1
+        stats.parse_time += parse_time
+
+
+def record_page_parse(parse_time: float):
+    stats = current_stats()
+
+    if stats is not None:
+        stats.page_parses += 1
+        stats.page_parse_time += parse_time
+
+
+def record_extract(extract_time: float):
+    stats = current_stats()
+
+    if stats is not None:
+        stats.extractions += 1
+        stats.extract_time += extract_time
+
+
+def record_event(size: int):
+    stats = current_stats()
+
+    if stats is not None:
+        stats.events += 1
+        stats.event_bytes += size
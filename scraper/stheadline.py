@@ -18,11 +18,12 @@ class HeadlineScraper(HTMLScraper):
             item_date_selector="meta[property='article:published_time'][content]",  # <meta property="article:published_time" content="???">
             item_url_selector="meta[property='og:url'][content]",  # <meta property="og:url" content="???">
             item_author_selector="meta[name='publisher'][content]",
+            item_body_selector=".paragraphs",
             **kwargs,
         )
         self.item_detail_selector = item_detail_selector
 
-    async def fetch_article(self, tag: "ResultSet[Tag]") -> "ResultSet[Tag]":
+    def get_article_url(self, tag: "ResultSet[Tag]") -> str:
         href_tag = tag.select_one(f"{self.item_detail_selector} > a")
 
         if href_tag is None:
@@ -33,6 +34,14 @@ class HeadlineScraper(HTMLScraper):
         if not article_url.startswith("http"):
             article_url = "https://stheadline.com" + article_url
 
+        return article_url
+
+    async def fetch_article(self, tag: "ResultSet[Tag]") -> "ResultSet[Tag]":
+        article_url = self.get_article_url(tag)
+
+        if article_url is None:
+            return None
+
         content = await fetch_content(
             article_url,
             headers={**self.headers, "Referer": self.index_url},
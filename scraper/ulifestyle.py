@@ -21,16 +21,23 @@ class ULifestyleScraper(HTMLScraper):
             item_date_selector="meta[property='article:published_time'][content]",  # 2025-06-17T13:50:00+0800
             item_url_selector="meta[property='og:url'][content]",
             item_author_selector="meta[property='article:author'][content]",
+            item_body_selector=".article-content",
             **kwargs,
         )
 
-    async def fetch_article(self, tag: "ResultSet[Tag]") -> "ResultSet[Tag]":
+    def get_article_url(self, tag: "ResultSet[Tag]") -> str:
         href_tag = tag.select_one(".card > .card-body .card-title > a")
 
         if href_tag is None:
             return None
 
-        article_url = href_tag["href"]
+        return href_tag["href"]
+
+    async def fetch_article(self, tag: "ResultSet[Tag]") -> "ResultSet[Tag]":
+        article_url = self.get_article_url(tag)
+
+        if article_url is None:
+            return None
 
         content = await fetch_content(
             article_url,
@@ -1,50 +1,464 @@
+import asyncio
+import codecs
+import json
+import re
+import time
+from contextlib import contextmanager
+from contextvars import Context, ContextVar, copy_context
 import aiohttp
-from tenacity import retry, stop_after_attempt, wait_fixed
-from typing import Optional, TYPE_CHECKING
+from tenacity import (
+    RetryCallState,
+    retry,
+    retry_if_exception_type,
+    stop_after_attempt,
+    wait_random_exponential,
+)
+from typing import Optional, Callable, Dict, Tuple, Union, TYPE_CHECKING
+from scraper.stats import record_fetch
+from scraper.proxy_pool import proxied_session
+from scraper.rate_limit import HostSlotTimeout, limit_host, parse_retry_after
+from scraper.link_cache import current_link_cache
+from scraper.cassette import RecordedResponse, current_cassette
+from scraper.single_flight import current_coalescer, get_request_key
+from scraper.http_cache import (
+    CachedResponse,
+    HTTPCache,
+    NotModified,
+    current_http_cache,
+)
 
 if TYPE_CHECKING:
     from aiosocks import Socks5Addr
 
+_url_rewriter: Optional[Callable[[str], str]] = None
 
-@retry(stop=stop_after_attempt(3), wait=wait_fixed(3))
-async def fetch_header_location(
-    url: str, conn: Optional["Socks5Addr"] = None, timeout=10, headers=None
-) -> str:
+
+def set_url_rewriter(rewriter: Optional[Callable[[str], str]]):
     """
-    Get the original url from shortened URL.
+    Sets a function rewriting the URL of every request, e.g. to serve recorded responses from a local server.
 
     Args:
-      url (str): The URL to fetch.
+      rewriter (Optional[Callable[[str], str]]): The function, or None to send the requests as is.
+    """
+    global _url_rewriter
+    _url_rewriter = rewriter
+
+
+def rewrite_url(url: str) -> str:
+    return _url_rewriter(url) if _url_rewriter is not None else url
+
+
+# the responses worth another attempt, the others are returned or raised as is
+RETRYABLE_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+MAX_ATTEMPTS = 3
+# the exponential backoff between attempts, with full jitter
+BACKOFF_MULTIPLIER = 1.0
+MAX_BACKOFF = 10.0
+
+# the largest response body read, larger responses are aborted
+MAX_BODY_SIZE = 10 * 1024**2
+READ_CHUNK_SIZE = 64 * 1024
+# the BOMs stripped from the body, and the encoding they mark
+BOMS = [
+    (codecs.BOM_UTF8, "utf-8"),
+    (codecs.BOM_UTF16_LE, "utf-16-le"),
+    (codecs.BOM_UTF16_BE, "utf-16-be"),
+]
+# the charset declared by a meta tag or XML declaration, looked up in the start of the body
+DECLARED_CHARSET_PATTERN = re.compile(
+    rb"""<meta[^>]+charset=["']?([\w.:-]+)|<\?xml[^>]+encoding=["']([\w.:-]+)""",
+    re.IGNORECASE,
+)
+
+_deadline: ContextVar[Optional[float]] = ContextVar("fetch_deadline", default=None)
+
+
+class RetryableStatusError(Exception):
+    """
+    Raised when a response has a retryable status, e.g. 503.
+    """
+
+    def __init__(self, url: str, status: int, retry_after: Optional[float] = None):
+        super().__init__(f"{url} responded with status {status}")
+        self.url = url
+        self.status = status
+        self.retry_after = retry_after
+
+
+class ResponseTooLarge(Exception):
+    """
+    Raised when a response body is larger than the maximum size read.
+    """
+
+
+class DeadlineExceeded(Exception):
+    """
+    Raised instead of fetching once the time budget of the scraper is spent.
+    """
+
+
+@contextmanager
+def fetch_deadline(budget: Optional[float]):
+    """
+    Sets the time budget of the fetches run in this context, e.g. of a scraper.
+
+    Once the budget is spent the fetch helpers raise DeadlineExceeded instead of sending
+    requests, and no retry is scheduled past it.
+
+    Args:
+      budget (Optional[float]): The budget in seconds, or None for no limit.
+    """
+    token = _deadline.set(time.monotonic() + budget if budget is not None else None)
+
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def _get_remaining_time() -> Optional[float]:
+    deadline = _deadline.get()
+
+    return deadline - time.monotonic() if deadline is not None else None
+
+
+def _shared_context() -> Context:
+    """
+    Returns the context of a request shared by several fetches, e.g. a coalesced one.
+
+    It is a copy of the current context without the fetch deadline, so the request is not
+    cut short by the budget of the scraper which sent it first. Each fetch applies its own
+    deadline while waiting for the request instead, and the request is cancelled once the
+    deadlines of all the fetches waiting for it are spent.
+    """
+    context = copy_context()
+    context.run(_deadline.set, None)
+
+    return context
+
+
+def _check_deadline(url: str):
+    remaining = _get_remaining_time()
+
+    if remaining is not None and remaining <= 0:
+        raise DeadlineExceeded(f"The time budget is spent, not fetching {url}")
+
+
+def _check_status(url: str, response):
+    if response.status in RETRYABLE_STATUSES:
+        raise RetryableStatusError(
+            url,
+            response.status,
+            retry_after=parse_retry_after(response.headers.get("Retry-After")),
+        )
+
+
+def _wait_backoff(retry_state: RetryCallState) -> float:
+    delay = wait_random_exponential(multiplier=BACKOFF_MULTIPLIER, max=MAX_BACKOFF)(
+        retry_state
+    )
+    error = retry_state.outcome.exception()
+
+    if isinstance(error, RetryableStatusError) and error.retry_after is not None:
+        delay = max(delay, error.retry_after)
+
+    return delay
+
+
+def _stop_at_deadline(retry_state: RetryCallState) -> bool:
+    # do not sleep past the deadline, the attempt after it would fail anyway
+    remaining = _get_remaining_time()
+
+    return remaining is not None and remaining <= (
+        getattr(retry_state, "upcoming_sleep", 0) or 0
+    )
+
+
+# the retry policy of all fetch helpers
+_retry_policy = retry(
+    stop=stop_after_attempt(MAX_ATTEMPTS) | _stop_at_deadline,
+    wait=_wait_backoff,
+    retry=retry_if_exception_type(
+        (aiohttp.ClientConnectionError, asyncio.TimeoutError, RetryableStatusError)
+    ),
+    reraise=True,
+)
+
+
+async def _read_body(url: str, response, max_size: int) -> bytes:
+    """
+    Reads the response body in chunks, aborting as soon as it is larger than `max_size`.
+    """
+    if response.content_length is not None and response.content_length > max_size:
+        raise ResponseTooLarge(
+            f"{url} is {response.content_length} bytes, more than {max_size}"
+        )
+
+    content = bytearray()
+
+    async for chunk in response.content.iter_chunked(READ_CHUNK_SIZE):
+        content.extend(chunk)
+
+        if len(content) > max_size:
+            raise ResponseTooLarge(f"{url} is more than {max_size} bytes")
+
+    return bytes(content)
+
+
+def decode_body(content: bytes, charset: Optional[str] = None) -> str:
+    """
+    Decodes a response body once, stripping its BOM.
+
+    The encoding is taken from the BOM, then the charset of the Content-Type header, then
+    the charset declared in the body, and defaults to UTF-8.
+
+    Args:
+      content (bytes): The response body.
+      charset (Optional[str]): The charset of the Content-Type header.
 
     Returns:
-      str: The header location of the URL.
+      str: The decoded body.
     """
-    async with aiohttp.ClientSession(connector=conn) as session:
-        async with session.head(
-            url, allow_redirects=True, timeout=timeout, headers=headers
-        ) as response:
-            return response.url
+    for bom, encoding in BOMS:
+        if content.startswith(bom):
+            return content[len(bom) :].decode(encoding, errors="replace")
+
+    if charset is None:
+        match = DECLARED_CHARSET_PATTERN.search(content[:4096])
+
+        if match is not None:
+            charset = (match.group(1) or match.group(2)).decode("ascii")
+
+    try:
+        return content.decode(charset or "utf-8", errors="replace")
+    except LookupError:
+        # unknown charset
+        return content.decode("utf-8", errors="replace")
+
+
+def _get_cached(
+    url: str, method: str = "GET", body=None
+) -> Tuple[Optional[HTTPCache], str, Optional[CachedResponse], Dict[str, str]]:
+    """
+    Looks up the cached response of a conditional request.
+
+    Returns:
+      Tuple: The active cache, the cache key, the cached response and the validator headers to send.
+    """
+    cache = current_http_cache()
+    key = HTTPCache.get_key(url, method, body)
+    cached = cache.get(key) if cache is not None else None
+    validator_headers = {}
+
+    if cached is not None and cached.etag:
+        validator_headers["If-None-Match"] = cached.etag
+    if cached is not None and cached.last_modified:
+        validator_headers["If-Modified-Since"] = cached.last_modified
+
+    return cache, key, cached, validator_headers
+
+
+def _cache_response(
+    cache: Optional[HTTPCache], key: str, url: str, response, content: bytes
+):
+    etag = response.headers.get("ETag")
+    last_modified = response.headers.get("Last-Modified")
+
+    if cache is not None and response.status == 200 and (etag or last_modified):
+        cache.add(key, CachedResponse(url, etag, last_modified, content))
+
+
+async def _request(
+    url: str,
+    method="GET",
+    conn: Optional["Socks5Addr"] = None,
+    timeout=10,
+    headers=None,
+    body=None,
+    conditional=False,
+    max_size=MAX_BODY_SIZE,
+) -> RecordedResponse:
+    """
+    Sends a request, or shares the response of an identical request of the run.
+
+    Conditional requests and requests with their own connector are always sent.
+    """
+
+    async def send() -> RecordedResponse:
+        return await _send_request(
+            url,
+            method=method,
+            conn=conn,
+            timeout=timeout,
+            headers=headers,
+            body=body,
+            conditional=conditional,
+            max_size=max_size,
+        )
+
+    coalescer = current_coalescer()
+
+    if coalescer is None or conditional or conn is not None:
+        return await send()
+
+    _check_deadline(url)
+    key = get_request_key(url, method, headers, body) + f" {max_size}"
+
+    try:
+        return await coalescer.fetch(
+            key, send, timeout=_get_remaining_time(), context=_shared_context()
+        )
+    except asyncio.TimeoutError:
+        # the budget ran out while waiting, otherwise the shared request itself timed out
+        _check_deadline(url)
+        raise
+
+
+@_retry_policy
+async def _send_request(
+    url: str,
+    method="GET",
+    conn: Optional["Socks5Addr"] = None,
+    timeout=10,
+    headers=None,
+    body=None,
+    conditional=False,
+    max_size=MAX_BODY_SIZE,
+) -> RecordedResponse:
+    """
+    Sends a request through the shared session, the rate limiter and the HTTP cache.
+
+    The response is recorded to the active cassette, or served from it in replay mode
+    without sending the request.
+    """
+    _check_deadline(url)
+    cassette = current_cassette()
+
+    if cassette is not None and cassette.replaying:
+        response = cassette.play(method, url, body)
+        record_fetch(0.0, len(response.content), error=False)
+
+        return response
+
+    start = time.perf_counter()
+    size = 0
+    error = True
+    cache, key, cached, validator_headers = (
+        _get_cached(url, method, body) if conditional else (None, None, None, {})
+    )
+
+    try:
+        # the proxy is chosen and timed once the host slot is acquired, the wait for the
+        # slot is not counted as the latency of the proxy, and it is bounded by the deadline
+        async with limit_host(
+            url, timeout=_get_remaining_time()
+        ) as slot, proxied_session(url, conn) as proxied:
+            async with proxied.session.request(
+                method,
+                rewrite_url(url),
+                timeout=timeout,
+                headers={**(headers or {}), **validator_headers},
+                data=body,
+                allow_redirects=True,
+                proxy=proxied.request_proxy,
+            ) as response:
+                proxied.record_response(response)
+                slot.record_response(response)
+                _check_status(url, response)
+                content = (
+                    await _read_body(url, response, max_size)
+                    if method != "HEAD"
+                    else b""
+                )
+                size = len(content)
+                error = False
+
+                if cached is not None and response.status == 304:
+                    cache.touch(key, url)
+                    raise NotModified(url, cached.body)
+
+                _cache_response(cache, key, url, response, content)
+                recorded_response = RecordedResponse(
+                    str(response.url),
+                    response.status,
+                    response.headers.get("Content-Type"),
+                    content,
+                )
+    except HostSlotTimeout as e:
+        raise DeadlineExceeded(
+            f"The time budget is spent waiting to fetch {url}"
+        ) from e
+    finally:
+        record_fetch(time.perf_counter() - start, size, error=error)
+
+    if cassette is not None:
+        cassette.record(method, url, body, recorded_response)
+
+    return recorded_response
 
 
-@retry(stop=stop_after_attempt(3), wait=wait_fixed(3))
 async def fetch_content(
-    url: str, conn: Optional["Socks5Addr"] = None, timeout=10, headers=None
-) -> str:
+    url: str,
+    conn: Optional["Socks5Addr"] = None,
+    timeout=10,
+    headers=None,
+    conditional=False,
+    max_size=MAX_BODY_SIZE,
+    as_bytes=False,
+) -> Union[str, bytes]:
     """
     Get the content of the URL.
 
     Args:
       url (str): The URL to fetch.
+      conditional (bool): If True and the HTTP cache is active, the validators of the cached
+        response are sent, and NotModified is raised if the content has not changed.
+      max_size (int): The largest body read, ResponseTooLarge is raised for larger ones.
+      as_bytes (bool): If True the body is returned undecoded.
+
+    Returns:
+      Union[str, bytes]: The content of the URL.
+    """
+    response = await _request(
+        url,
+        conn=conn,
+        timeout=timeout,
+        headers=headers,
+        conditional=conditional,
+        max_size=max_size,
+    )
+
+    return (
+        response.content
+        if as_bytes
+        else decode_body(response.content, response.charset)
+    )
+
+
+async def fetch_short_url_content(url: str, timeout=10, headers=None) -> str:
+    """
+    Get the content of a shortened URL (e.g. a bit.ly link), through the link cache.
+
+    A link cached by an earlier fetch is fetched at its final URL directly, instead of
+    following its redirects again. Otherwise the link is fetched following the redirects,
+    and the final URL of the response is cached, without a separate request to resolve it.
+
+    Args:
+      url (str): The shortened URL.
 
     Returns:
       str: The content of the URL.
     """
-    async with aiohttp.ClientSession(connector=conn) as session:
-        async with session.get(url, timeout=timeout, headers=headers) as response:
-            return await response.text()
+    link_cache = current_link_cache()
+    resolved_url = link_cache.get(url) if link_cache is not None else None
+    response = await _request(resolved_url or url, timeout=timeout, headers=headers)
+
+    if link_cache is not None and resolved_url is None and response.url != url:
+        link_cache.add(url, response.url)
+
+    return decode_body(response.content, response.charset)
 
 
-# @retry(stop=stop_after_attempt(3), wait=wait_fixed(1))
 async def fetch_json(
     url: str,
     conn: Optional["Socks5Addr"] = None,
@@ -52,26 +466,38 @@ async def fetch_json(
     method="GET",
     headers=None,
     body=None,
+    conditional=False,
+    max_size=MAX_BODY_SIZE,
 ) -> dict:
     """
     Get the JSON content of the URL.
 
     Args:
       url (str): The URL to fetch.
+      conditional (bool): If True and the HTTP cache is active, the validators of the cached
+        response are sent, and NotModified is raised if the content has not changed.
+      max_size (int): The largest body read, ResponseTooLarge is raised for larger ones.
 
     Returns:
       dict: The JSON content of the URL.
     """
-    async with aiohttp.ClientSession(connector=conn) as session:
-        headers = headers or {}
-        headers.setdefault("Content-Type", "application/json")
-        headers.setdefault("Accept", "application/json")
-        headers.setdefault("x-requested-with", "XMLHttpRequest")
+    headers = headers or {}
+    headers.setdefault("Content-Type", "application/json")
+    headers.setdefault("Accept", "application/json")
+    headers.setdefault("x-requested-with", "XMLHttpRequest")
+
+    response = await _request(
+        url,
+        method=method,
+        conn=conn,
+        timeout=timeout,
+        headers=headers,
+        body=body,
+        conditional=conditional,
+        max_size=max_size,
+    )
 
-        async with session.request(
-            method, url, timeout=timeout, headers=headers, data=body
-        ) as response:
-            return await response.json()
+    return json.loads(decode_body(response.content, response.charset))
 
 
 def text_processing(text: str) -> str:
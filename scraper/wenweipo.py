@@ -21,16 +21,23 @@ class WenWeiPoScraper(HTMLScraper):
             item_date_selector="time.publish-date",  # 2025-07-04 04:30:53
             item_url_selector="meta[property='og:url'][content]",
             item_author_selector="meta[property='article:author'][content]",
+            item_body_selector=".post-body",
             **kwargs,
         )
 
-    async def fetch_article(self, tag: "ResultSet[Tag]") -> "ResultSet[Tag]":
+    def get_article_url(self, tag: "ResultSet[Tag]") -> str:
         href_tag = tag.select_one(".story-item-text > a")
 
         if href_tag is None:
             return None
 
-        article_url = href_tag["href"]
+        return href_tag["href"]
+
+    async def fetch_article(self, tag: "ResultSet[Tag]") -> "ResultSet[Tag]":
+        article_url = self.get_article_url(tag)
+
+        if article_url is None:
+            return None
 
         content = await fetch_content(
             article_url,
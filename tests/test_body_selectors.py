@@ -0,0 +1,88 @@
+import glob
+import os
+import pytest
+from bs4 import BeautifulSoup
+from scraper.mingpao import MingPaoScraper
+from scraper.stheadline import HeadlineNewsScraper
+from scraper.ulifestyle import ULifestyleScraper
+from scraper.wenweipo import WenWeiPoScraper
+
+PAGES_DIR = os.path.join(os.path.dirname(__file__), "fixtures", "body_selectors")
+# trimmed copies of real article pages, e.g. from a `scrape.py --record` cassette, named
+# `<site>.html` with the expected body text in `<site>.txt`
+RECORDED_PAGES_DIR = os.path.join(PAGES_DIR, "recorded")
+
+# the article pages are handwritten after the markup the selectors target, with the
+# navigation, related links and footer of the site around the body, until they are
+# replaced by recorded pages
+BODIES = {
+    "mingpao": (
+        MingPaoScraper,
+        [
+            "天文台表示，一道高壓脊會在未來一兩日為華南沿岸帶來炎熱天氣，明日最高氣溫約33度。",
+            "天文台提醒市民，在炎熱天氣下進行戶外活動應補充足夠水分，並避免長時間在陽光下曝曬。",
+            "下周初一道低壓槽會為廣東沿岸帶來較多驟雨及幾陣狂風雷暴。",
+        ],
+    ),
+    "stheadline": (
+        HeadlineNewsScraper,
+        [
+            "港鐵表示，東鐵綫今早約七時半因訊號故障，列車服務一度受阻，大學站至旺角東站之間班次需要延長。",
+            "經工程人員搶修後，列車服務已於八時許逐步回復正常，港鐵對事件為乘客帶來不便致歉。",
+        ],
+    ),
+    "wenweipo": (
+        WenWeiPoScraper,
+        [
+            "政府統計處發表的數字顯示，本港6月零售業總銷貨價值按年上升，是連續第二個月錄得升幅。",
+            "政府發言人表示，訪港旅客人數持續增加，加上本地消費氣氛改善，為零售業帶來支持。",
+        ],
+    ),
+    "ulifestyle": (
+        ULifestyleScraper,
+        [
+            "天氣愈來愈熱，不少人都想找個涼快的地方歎杯凍飲，今次為大家搜羅了5間特色冰室。",
+            "位於深水埗的老字號冰室保留了懷舊裝潢，招牌菠蘿油配凍奶茶是必食之選。",
+            "另一間位於觀塘的新派冰室就主打創意甜品，芒果班戟同紅豆冰都大受歡迎。",
+        ],
+    ),
+}
+
+
+def load_page(site: str, pages_dir: str = PAGES_DIR) -> BeautifulSoup:
+    with open(os.path.join(pages_dir, f"{site}.html"), encoding="utf-8") as f:
+        return BeautifulSoup(f.read(), "html.parser")
+
+
+RECORDED_SITES = sorted(
+    os.path.splitext(os.path.basename(path))[0]
+    for path in glob.glob(os.path.join(RECORDED_PAGES_DIR, "*.html"))
+)
+
+
+@pytest.mark.parametrize("site", sorted(BODIES))
+def test_body_selector_extracts_the_article_body(site):
+    scraper_class, paragraphs = BODIES[site]
+    article = scraper_class().parse_article(load_page(site))
+
+    assert article.extracted == "\n".join(paragraphs)
+
+
+@pytest.mark.parametrize("site", sorted(BODIES))
+def test_missed_body_selector_falls_back_to_html_extraction(site):
+    scraper_class, _ = BODIES[site]
+    page = load_page(site)
+
+    for elem in page.select(scraper_class().item_body_selector):
+        elem.decompose()
+
+    assert scraper_class().parse_article(page).extracted is None
+
+
+@pytest.mark.parametrize("site", RECORDED_SITES)
+def test_body_selector_extracts_the_body_of_a_recorded_page(site):
+    scraper_class, _ = BODIES[site]
+    article = scraper_class().parse_article(load_page(site, RECORDED_PAGES_DIR))
+
+    with open(os.path.join(RECORDED_PAGES_DIR, f"{site}.txt"), encoding="utf-8") as f:
+        assert article.extracted == f.read().strip()
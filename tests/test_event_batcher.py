@@ -0,0 +1,37 @@
+import asyncio
+import json
+from scrape import EventBatcher
+
+
+def test_batch_is_flushed_after_the_interval_without_new_events():
+    async def run():
+        batches = []
+        batcher = EventBatcher(sink=batches.append, flush_interval=0.01)
+        batcher.add({"event": "scraping", "payload": {"id": "1"}})
+        sent_before_interval = list(batches)
+        await asyncio.sleep(0.05)
+
+        return sent_before_interval, batches
+
+    sent_before_interval, batches = asyncio.run(run())
+
+    assert sent_before_interval == []
+    assert [json.loads(batch) for batch in batches] == [
+        [{"event": "scraping", "payload": {"id": "1"}}]
+    ]
+
+
+def test_flush_cancels_the_timer():
+    async def run():
+        batches = []
+        batcher = EventBatcher(sink=batches.append, flush_interval=0.01)
+        batcher.add({"event": "scraping", "payload": {"id": "1"}})
+        batcher.flush()
+        await asyncio.sleep(0.05)
+
+        return batches, batcher._timer
+
+    batches, timer = asyncio.run(run())
+
+    assert len(batches) == 1
+    assert timer is None
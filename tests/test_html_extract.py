@@ -0,0 +1,55 @@
+import glob
+import os
+import pytest
+from benchmarks.extract_parity import similarity
+from html_extractor.html_extractor import (
+    html_extract,
+    html_extract_difflib,
+)
+
+PAGES_DIR = os.path.join(os.path.dirname(__file__), "fixtures", "html_extract")
+
+
+def load_site_pages(site: str):
+    paths = sorted(glob.glob(os.path.join(PAGES_DIR, f"{site}_*.html")))
+
+    return [open(path, encoding="utf-8").read() for path in paths]
+
+
+# each page against the page before it, the first one against the last one, like a run
+PAIRS = [
+    (site, index)
+    for site in ("news", "magazine")
+    for index in range(len(load_site_pages(site)))
+]
+
+
+@pytest.mark.parametrize("site, index", PAIRS)
+def test_html_extract_parity_with_difflib(site, index):
+    pages = load_site_pages(site)
+    extracted = html_extract(pages[index - 1], pages[index])
+    expected = html_extract_difflib(pages[index - 1], pages[index])
+
+    assert similarity(extracted, expected) >= 0.9
+    # the text found by html_extract is always found by the diff too
+    assert set(extracted.splitlines()) <= set(expected.splitlines())
+
+
+def test_html_extract_matches_difflib_on_same_layout():
+    pages = load_site_pages("magazine")
+
+    for index in range(len(pages)):
+        assert html_extract(pages[index - 1], pages[index]) == html_extract_difflib(
+            pages[index - 1], pages[index]
+        )
+
+
+def test_html_extract_ignores_moved_lines():
+    # a related link moved up the list is an addition for the diff, but not new text
+    pages = load_site_pages("news")
+    extracted = html_extract(pages[0], pages[1])
+    expected = html_extract_difflib(pages[0], pages[1])
+
+    assert "天文台發出酷熱天氣警告" in expected
+    assert "天文台發出酷熱天氣警告" not in extracted
+    assert "市區最低氣溫預料約攝氏十三度，新界部分地區會再低兩三度。" in extracted
@@ -0,0 +1,19 @@
+import asyncio
+import pytest
+from scraper.rate_limit import HostSlotTimeout, RateLimiter
+
+
+def test_waiting_for_a_host_slot_times_out_without_taking_it():
+    async def run():
+        limiter = RateLimiter(initial_concurrency=1, max_concurrency=1)
+
+        async with limiter.limit("https://example.com/1"):
+            with pytest.raises(HostSlotTimeout):
+                async with limiter.limit("https://example.com/2", timeout=0.01):
+                    pass
+
+        host_limiter = limiter.get_host_limiter("https://example.com")
+
+        return host_limiter.in_flight
+
+    assert asyncio.run(run()) == 0
@@ -0,0 +1,121 @@
+import asyncio
+import datetime
+from scraper.scraper import Scraper, ScraperOutput
+from scraper.seen_store import SeenStore
+
+TODAY = datetime.date(2025, 6, 20)
+
+
+class FakeScraper(Scraper):
+    """
+    A scraper of `num_items` HTML articles, the first `num_fresh` ones published today.
+    """
+
+    def __init__(self, num_items: int, num_fresh: int, **kwargs):
+        super().__init__(index_url="https://example.com", category="news", **kwargs)
+        self.num_items = num_items
+        self.num_fresh = num_fresh
+
+    async def parse_index(self):
+        return list(range(self.num_items))
+
+    def get_index_key(self, item):
+        return str(item)
+
+    def get_index_date(self, item):
+        date = TODAY if item < self.num_fresh else TODAY - datetime.timedelta(days=3)
+
+        return datetime.datetime.combine(date, datetime.time())
+
+    def parse_article(self, item):
+        return ScraperOutput(
+            str(item),
+            f"T{item}",
+            f"<html><body><nav>Home</nav><h1>T{item}</h1><p>Body of article {item}</p></body></html>",
+            "text/html",
+            "news",
+            author=None,
+            date=None,
+            url=None,
+        )
+
+
+async def collect(scraper: Scraper, **kwargs):
+    return [article async for article in scraper.iter_articles(**kwargs)]
+
+
+def test_stale_article_is_kept_as_reference_of_a_single_fresh_one():
+    scraper = FakeScraper(num_items=4, num_fresh=1)
+    articles = asyncio.run(collect(scraper, published_on=TODAY))
+
+    assert sorted((article.id, article.reference_only) for article in articles) == [
+        ("0", False),
+        ("1", True),
+    ]
+    assert scraper.num_skipped == 2
+
+
+def test_no_reference_is_kept_for_several_fresh_articles():
+    scraper = FakeScraper(num_items=4, num_fresh=2)
+    articles = asyncio.run(collect(scraper, published_on=TODAY))
+
+    assert sorted(article.id for article in articles) == ["0", "1"]
+    assert not any(article.reference_only for article in articles)
+
+
+class PagesScraper(FakeScraper):
+    """
+    A scraper of the given HTML pages and publish dates, all listed in the index as fresh.
+    """
+
+    def __init__(self, pages, dates, **kwargs):
+        super().__init__(num_items=len(pages), num_fresh=len(pages), **kwargs)
+        self.pages = pages
+        self.dates = dates
+
+    def parse_article(self, item):
+        return ScraperOutput(
+            str(item),
+            f"T{item}",
+            self.pages[item],
+            "text/html",
+            "news",
+            author=None,
+            date=self.dates[item],
+            url=None,
+        )
+
+
+def test_only_the_sent_articles_with_text_are_marked_seen(tmp_path):
+    from scrape import process_scraper
+
+    class Batcher:
+        def __init__(self):
+            self.events = []
+
+        def add(self, event):
+            self.events.append(event)
+
+    page = "<html><body><nav>Home</nav><p>Body of article {}</p></body></html>"
+    yesterday = datetime.datetime.combine(TODAY, datetime.time()) - datetime.timedelta(
+        days=1
+    )
+    seen_store = SeenStore(str(tmp_path / "seen.db"))
+    # the page of the second article is the same as the first one, so nothing is extracted,
+    # and the third article is not published today
+    scraper = PagesScraper(
+        [page.format(0), page.format(0), page.format(2)],
+        [None, None, yesterday],
+        seen_store=seen_store,
+    )
+    batcher = Batcher()
+
+    assert asyncio.run(process_scraper("fake", scraper, batcher, TODAY, "ts"))
+    seen_store.commit()
+
+    assert sorted(event["payload"]["id"] for event in batcher.events) == ["0", "1"]
+    assert [f"PagesScraper:{item}" in seen_store for item in range(3)] == [
+        True,
+        False,
+        False,
+    ]
@@ -0,0 +1,64 @@
+import asyncio
+from contextvars import ContextVar, copy_context
+from scraper.cassette import RecordedResponse
+from scraper.single_flight import RequestCoalescer
+
+caller: ContextVar[str] = ContextVar("caller", default="none")
+
+
+def test_waiter_timeout_does_not_cancel_the_shared_request():
+    async def run():
+        coalescer = RequestCoalescer()
+        seen_callers = []
+
+        async def send() -> RecordedResponse:
+            seen_callers.append(caller.get())
+            await asyncio.sleep(0.05)
+
+            return RecordedResponse("https://example.com", 200, "text/plain", b"ok")
+
+        async def fetch(name: str, timeout):
+            caller.set(name)
+            context = copy_context()
+            context.run(caller.set, "shared")
+
+            return await coalescer.fetch("key", send, timeout=timeout, context=context)
+
+        results = await asyncio.gather(
+            fetch("first", 0.01), fetch("second", None), return_exceptions=True
+        )
+
+        return seen_callers, results
+
+    seen_callers, (first, second) = asyncio.run(run())
+
+    assert seen_callers == ["shared"]
+    assert isinstance(first, asyncio.TimeoutError)
+    assert second.content == b"ok"
+
+
+def test_shared_request_is_cancelled_once_every_waiter_timed_out():
+    async def run():
+        coalescer = RequestCoalescer()
+        attempts = []
+
+        async def send() -> RecordedResponse:
+            # a request retried in the background until it is cancelled
+            while True:
+                attempts.append(len(attempts))
+                await asyncio.sleep(0.01)
+
+        results = await asyncio.gather(
+            coalescer.fetch("key", send, timeout=0.02),
+            coalescer.fetch("key", send, timeout=0.03),
+            return_exceptions=True,
+        )
+        num_attempts = len(attempts)
+        await asyncio.sleep(0.05)
+
+        return results, num_attempts, len(attempts)
+
+    results, num_attempts, final_attempts = asyncio.run(run())
+
+    assert all(isinstance(result, asyncio.TimeoutError) for result in results)
+    assert final_attempts == num_attempts